@@ -0,0 +1,104 @@
+""" Compares per-page encode time and file size of the OpenCV encoder with
+the GdkPixbuf savers for every format and compression a project offers.
+
+    python benchmark/encode.py [--image page.jpg] [--runs 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2 as opencv2
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "vhdscan"))
+
+from gi.repository import GLib, GdkPixbuf  # noqa: E402
+from lib import encoder, project  # noqa: E402
+
+
+def synthetic_page(width, height):
+    """ Returns a BGR frame with paper gradient, noise and text lines. """
+
+    y, x = numpy.mgrid[0:height, 0:width]
+    paper = 200 + 30 * (x / width) + 10 * (y / height)
+    frame = numpy.dstack([paper - 10, paper, paper + 5]).astype(numpy.float32)
+    frame += numpy.random.default_rng(0).normal(0, 4, frame.shape)
+    frame = frame.clip(0, 255).astype(numpy.uint8)
+    for line in range(height // 10, height - height // 10, 40):
+        opencv2.putText(
+            frame, "Lorem ipsum dolor sit amet, consectetur adipiscing elit",
+            (width // 12, line), opencv2.FONT_HERSHEY_SIMPLEX, 1.0, (30, 30, 30), 2,
+        )
+    return frame
+
+
+def cases():
+    yield project.FORMAT_JPEG, "quality", project.DEFAULT_JPEG_QUALITY
+    yield project.FORMAT_PNG, "compression", project.DEFAULT_PNG_COMPRESSION
+    for name, compression in project.TIFF_COMPRESSIONS:
+        yield project.FORMAT_TIFF, "compression", compression
+
+
+def measure(runs, encode):
+    timings = []
+    size = None
+    for i in range(runs):
+        tick = time.perf_counter()
+        size = encode()
+        timings.append(time.perf_counter() - tick)
+    return min(timings), size
+
+
+def encode_opencv(frame, format, options):
+    return len(encoder.encode(frame, format, options))
+
+
+def encode_pixbuf(pixbuf, format, options):
+    keys = list(options)
+    values = [str(options[key]) for key in keys]
+    return len(pixbuf.save_to_bufferv(format, keys, values)[1])
+
+
+def new_pixbuf(frame):
+    rgb = opencv2.cvtColor(frame, opencv2.COLOR_BGR2RGB)
+    height, width = rgb.shape[0:2]
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(rgb.tobytes()),
+        GdkPixbuf.Colorspace.RGB, False, 8, width, height, width * 3,
+    )
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", help="page photo to encode", default="")
+    parser.add_argument("--width", type=int, default=3264)
+    parser.add_argument("--height", type=int, default=2448)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.image:
+        frame = opencv2.imread(args.image)
+    else:
+        frame = synthetic_page(args.width, args.height)
+    pixbuf = new_pixbuf(frame)
+
+    height, width = frame.shape[0:2]
+    print("{0}x{1}, best of {2} runs".format(width, height, args.runs))
+    print("{0:<6} {1:<16} {2:<10} {3:>10} {4:>12}".format("format", "option", "encoder", "ms/page", "size (KiB)"))
+    for format, key, value in cases():
+        options = {key: value}
+        for name, encode in (
+            ("opencv", lambda: encode_opencv(frame, format, options)),
+            ("pixbuf", lambda: encode_pixbuf(pixbuf, format, options)),
+        ):
+            try:
+                seconds, size = measure(args.runs, encode)
+                result = "{0:>10.1f} {1:>12.1f}".format(seconds * 1000, size / 1024)
+            except Exception as error:
+                result = "failed: {0}".format(error)
+            print("{0:<6} {1:<16} {2:<10} {3}".format(format, "{0}={1}".format(key, value), name, result))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,78 @@
+""" Compares the per-frame cost of turning a BGR camera frame into a preview
+`GdkPixbuf` the way the baseline did, the way `frame.new_pixbuf` does now,
+and through a `memoryview`, which PyGObject converts element by element.
+
+    python benchmark/preview.py [--width 1920] [--height 1080] [--runs 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2 as opencv2
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "vhdscan"))
+
+from gi.repository import GLib, GdkPixbuf  # noqa: E402
+from lib import frame as framebuffer  # noqa: E402
+
+
+def baseline(frame):
+    # cvtColor allocates, tobytes copies, new_from_data copies into GLib.Bytes
+    rgb = opencv2.cvtColor(frame, opencv2.COLOR_BGR2RGB)
+    height, width = rgb.shape[0:2]
+    return GdkPixbuf.Pixbuf.new_from_data(
+        data=rgb.tobytes(),
+        colorspace=GdkPixbuf.Colorspace.RGB,
+        has_alpha=False,
+        bits_per_sample=8,
+        height=height,
+        width=width,
+        rowstride=width * 3,
+    )
+
+
+def current(frame):
+    return framebuffer.new_pixbuf(opencv2.cvtColor(frame, opencv2.COLOR_BGR2RGB))
+
+
+def memoryview_bytes(frame):
+    height, width = frame.shape[0:2]
+    rgb = opencv2.cvtColor(frame, opencv2.COLOR_BGR2RGB)
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(memoryview(rgb).cast("B")),
+        GdkPixbuf.Colorspace.RGB, False, 8, width, height, width * 3,
+    )
+
+
+def measure(runs, convert, frame):
+    timings = []
+    for i in range(runs):
+        tick = time.perf_counter()
+        convert(frame)
+        timings.append(time.perf_counter() - tick)
+    return min(timings), sum(timings) / len(timings)
+
+
+def run():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--with-memoryview", help="also time the slow memoryview path", action="store_true")
+    args = parser.parse_args()
+
+    frame = numpy.random.default_rng(0).integers(0, 256, (args.height, args.width, 3), dtype=numpy.uint8)
+    print("{0}x{1}, {2} runs".format(args.width, args.height, args.runs))
+    print("{0:<12} {1:>10} {2:>10}".format("path", "best ms", "mean ms"))
+    paths = [("baseline", baseline), ("new_pixbuf", current)]
+    if args.with_memoryview:
+        paths.append(("memoryview", memoryview_bytes))
+    for name, convert in paths:
+        best, mean = measure(args.runs, convert, frame)
+        print("{0:<12} {1:>10.2f} {2:>10.2f}".format(name, best * 1000, mean * 1000))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,87 @@
+import pytest
+
+from lib import bandwidth
+
+
+class Resolution:
+
+    def __init__(self, width, height, pixelformat):
+        self.width = width
+        self.height = height
+        self.pixelformat = pixelformat
+        self.value = "{0}x{1} {2}".format(width, height, pixelformat)
+
+
+class Device:
+
+    def __init__(self, bus="1", speed=480):
+        self.bus = bus
+        self.speed = speed
+
+
+class Camera:
+
+    def __init__(self, device, stream, resolutions=()):
+        self.device = device
+        self.stream = stream
+        self.resolutions = {resolution.value: resolution for resolution in resolutions}
+
+    def get_stream_resolution(self):
+        return self.stream
+
+
+@pytest.fixture(autouse=True)
+def streams(monkeypatch):
+    monkeypatch.setattr(bandwidth, "_streams", {})
+
+
+VGA_YUYV = Resolution(640, 480, "YUYV")
+HD_YUYV = Resolution(1920, 1080, "YUYV")
+HD_MJPG = Resolution(1920, 1080, "MJPG")
+QHD_YUYV = Resolution(1280, 720, "YUYV")
+
+
+def test_uncompressed_hd_exceeds_a_usb2_endpoint():
+    assert not bandwidth.fits(Device(), HD_YUYV, 15)
+    assert bandwidth.fits(Device(), HD_MJPG, 15)
+    # a USB 3 link has no such endpoint limit
+    assert bandwidth.fits(Device(speed=5000), HD_YUYV, 15)
+
+
+def test_feeds_share_a_bus():
+    device = Device()
+    cameras = [Camera(device, HD_MJPG) for i in range(4)]
+    for camera in cameras[0:3]:
+        assert bandwidth.reserve(camera, HD_MJPG, 15)
+    assert not bandwidth.reserve(cameras[3], HD_MJPG, 15)
+    # another bus has its own budget
+    assert bandwidth.reserve(Camera(Device(bus="2"), HD_MJPG), HD_MJPG, 15)
+    bandwidth.release(cameras[0])
+    assert bandwidth.reserve(cameras[3], HD_MJPG, 15)
+
+
+def test_a_camera_does_not_compete_with_itself():
+    device = Device()
+    camera = Camera(device, HD_MJPG)
+    assert bandwidth.reserve(camera, HD_MJPG, 15)
+    assert bandwidth.fits(device, HD_MJPG, 15, exclude=camera)
+
+
+def test_suggest_prefers_the_same_size_compressed():
+    device = Device()
+    other = Camera(device, HD_MJPG)
+    assert bandwidth.reserve(other, HD_MJPG, 15)
+    camera = Camera(device, HD_YUYV, [HD_YUYV, HD_MJPG, QHD_YUYV, VGA_YUYV])
+    assert bandwidth.suggest(camera, 15) is HD_MJPG
+
+
+def test_suggest_falls_back_to_a_smaller_size():
+    device = Device()
+    camera = Camera(device, HD_YUYV, [HD_YUYV, QHD_YUYV, VGA_YUYV])
+    assert bandwidth.suggest(camera, 15) is VGA_YUYV
+
+
+def test_suggest_without_a_fitting_resolution():
+    device = Device(speed=12)
+    camera = Camera(device, HD_YUYV, [HD_YUYV, QHD_YUYV])
+    assert bandwidth.suggest(camera, 15) is None
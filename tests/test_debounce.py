@@ -0,0 +1,82 @@
+import time
+
+from threading import Event, Timer
+
+from lib.debounce import Debouncer
+
+
+class Counter:
+
+    def __init__(self):
+        self.calls = 0
+        self.called = Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.called.set()
+
+
+def test_coalesces_a_burst():
+    counter = Counter()
+    debouncer = Debouncer(counter, delay=0.05, max_delay=5)
+    for i in range(10):
+        debouncer()
+    assert debouncer.is_pending()
+    assert counter.called.wait(1)
+    time.sleep(0.1)
+    assert counter.calls == 1
+    assert not debouncer.is_pending()
+
+
+def test_max_delay_bounds_a_stream_of_calls():
+    counter = Counter()
+    debouncer = Debouncer(counter, delay=0.2, max_delay=0.1)
+    started = time.monotonic()
+    while not counter.called.is_set() and time.monotonic() - started < 1:
+        debouncer()
+        time.sleep(0.01)
+    assert counter.called.is_set()
+    assert time.monotonic() - started < 0.5
+    debouncer.cancel()
+
+
+def test_flush_runs_on_the_calling_thread():
+    counter = Counter()
+    debouncer = Debouncer(counter, delay=10, max_delay=10)
+    debouncer()
+    assert debouncer.flush() is True
+    assert counter.calls == 1
+    assert not debouncer.is_pending()
+    assert debouncer.flush() is False
+    assert counter.calls == 1
+
+
+def test_cancel_drops_the_pending_call():
+    counter = Counter()
+    debouncer = Debouncer(counter, delay=0.05, max_delay=0.05)
+    debouncer()
+    debouncer.cancel()
+    time.sleep(0.15)
+    assert counter.calls == 0
+
+
+def test_call_waits_for_a_running_call():
+    order = []
+    running = Event()
+    proceed = Event()
+
+    def callback():
+        if not order:
+            running.set()
+            proceed.wait(1)
+        order.append(len(order))
+        return len(order)
+
+    debouncer = Debouncer(callback, delay=0, max_delay=0)
+    debouncer()
+    assert running.wait(1)
+    timer = Timer(0.05, proceed.set)
+    timer.start()
+    assert debouncer.call() == 2
+    assert order == [0, 1]
+    assert not debouncer.is_pending()
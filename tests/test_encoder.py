@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+pytest.importorskip("gi")
+
+from lib import encoder  # noqa: E402
+
+
+def test_write_replaces_the_file(tmp_path):
+    path = str(tmp_path / "0001_scan.jpg")
+    encoder.write(path, b"first image")
+    encoder.write(path, b"second")
+    with open(path, "rb") as file:
+        assert file.read() == b"second"
+    assert os.listdir(str(tmp_path)) == ["0001_scan.jpg"]
+
+
+def test_a_failed_write_leaves_no_temporary_file(tmp_path):
+    path = str(tmp_path / "0001_scan.jpg")
+    with pytest.raises(TypeError):
+        encoder.write(path, None)
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,102 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("gi")
+
+from lib.frame import Frame_Ring, RING_MIN_CAPACITY  # noqa: E402
+
+
+SHAPE = (4, 6, 3)
+
+
+def write(ring, value, timestamp=None):
+    index, buffer = ring.acquire(SHAPE)
+    buffer[:] = value
+    ring.commit(index, timestamp)
+    return index
+
+
+def test_latest_returns_the_newest_frames_oldest_first():
+    ring = Frame_Ring(capacity=4)
+    for value in range(1, 7):
+        write(ring, value)
+    with ring.latest(3) as frames:
+        assert [int(frame.image[0, 0, 0]) for frame in frames] == [4, 5, 6]
+        assert [frame.seq for frame in frames] == [4, 5, 6]
+    assert ring.seq == 6
+
+
+def test_capacity_follows_the_memory_limit():
+    ring = Frame_Ring(capacity=8, max_bytes=4 * 6 * 3 * 2)
+    write(ring, 1)
+    assert len(ring._pins) == RING_MIN_CAPACITY
+
+
+def test_pinned_frames_are_not_overwritten():
+    ring = Frame_Ring(capacity=3)
+    write(ring, 1)
+    with ring.latest() as pinned:
+        for value in range(2, 10):
+            write(ring, value)
+        assert int(pinned[0].image[0, 0, 0]) == 1
+
+
+def test_a_frame_is_dropped_when_every_slot_is_pinned():
+    ring = Frame_Ring(capacity=3)
+    for value in range(1, 4):
+        write(ring, value)
+    with ring.latest(3):
+        index, buffer = ring.acquire(SHAPE)
+        assert index == -1
+        ring.commit(index)
+    assert ring.dropped == 1
+    assert ring.seq == 3
+
+
+def test_nearest():
+    ring = Frame_Ring(capacity=4)
+    for value, timestamp in ((1, 10.0), (2, 10.1), (3, 10.2)):
+        write(ring, value, timestamp)
+    with ring.nearest(10.14) as frames:
+        assert int(frames[0].image[0, 0, 0]) == 2
+    with ring.nearest(99) as frames:
+        assert int(frames[0].image[0, 0, 0]) == 3
+
+
+def test_wait():
+    ring = Frame_Ring()
+    assert not ring.wait(0, timeout=0.01)
+    write(ring, 1)
+    assert ring.wait(0, timeout=0.01)
+    assert not ring.wait(1, timeout=0.01)
+    assert ring.wait(1, timeout=1, is_interrupted=lambda: True) is False
+
+
+def test_commit_after_clear_is_dropped():
+    ring = Frame_Ring()
+    index, buffer = ring.acquire(SHAPE)
+    ring.clear()
+    ring.commit(index)
+    assert ring.seq == 0
+    assert ring.dropped == 1
+
+
+def test_wait_after_discard_waits_for_the_next_frame():
+    ring = Frame_Ring()
+    write(ring, 1)
+    ring.discard()
+    assert not ring.wait(0, timeout=0.01)
+    assert not ring.wait(1, timeout=0.01)
+    write(ring, 2)
+    assert ring.wait(1, timeout=0.01)
+
+
+def test_a_frame_pinned_before_clear_does_not_release_a_new_slot():
+    ring = Frame_Ring(capacity=3)
+    write(ring, 1)
+    stale = ring.latest()
+    ring.clear()
+    write(ring, 2)
+    with ring.latest():
+        stale.release()
+        assert ring._pins[0] == 1
@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+from lib.index import Page_Index
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = Page_Index(str(tmp_path / "pages.index"))
+    yield index
+    index.close()
+
+
+def add_pages(index, pages):
+    for page in pages:
+        index.add(page, "/scans/{0:04d}.jpeg".format(page))
+
+
+def test_next_missing_after_the_current_page(index):
+    add_pages(index, [1, 2, 3, 5, 6])
+    assert index.get_next_missing(1, 8) == 4
+    assert index.get_next_missing(4, 8) == 7
+
+
+def test_next_missing_starts_over(index):
+    add_pages(index, [2, 3, 4, 5])
+    assert index.get_next_missing(3, 5) == 1
+
+
+def test_next_missing_skips_the_current_page(index):
+    add_pages(index, [1, 2])
+    # page 3 is where the operator is; the next one without an image is 4
+    assert index.get_next_missing(3, 4) == 4
+    assert index.get_next_missing(4, 4) == 3
+
+
+def test_next_missing_on_an_empty_index(index):
+    assert index.get_next_missing(1, 3) == 2
+    assert index.get_next_missing(3, 3) == 1
+
+
+def test_next_missing_when_complete(index):
+    add_pages(index, [1, 2, 3])
+    assert index.get_next_missing(2, 3) is None
+
+
+def test_pages_beyond_the_total_are_ignored(index):
+    add_pages(index, [1, 2, 9])
+    assert index.count_pages(3) == 2
+    assert index.get_next_missing(1, 3) == 3
+
+
+def test_duplicates_and_replaced_paths(index):
+    index.add(1, "/scans/0001.jpeg", slot="left")
+    index.add(1, "/scans/0001.jpeg", slot="left")
+    assert index.get_duplicates(2) == []
+    index.add(1, "/scans/0001 (1).jpeg", slot="left")
+    assert index.get_duplicates(2) == [1]
+    assert [image["slot"] for image in index.get_images(1)] == ["left", "left"]
+    index.remove("/scans/0001 (1).jpeg")
+    assert index.get_duplicates(2) == []
+
+
+def test_the_default_journal_is_used(tmp_path):
+    path = str(tmp_path / "pages.index")
+    index = Page_Index(path)
+    index._db.execute("PRAGMA journal_mode=WAL")
+    index.close()
+    index = Page_Index(path)
+    assert index._db.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    index.close()
+
+
+def test_a_broken_index_file_raises(tmp_path):
+    path = tmp_path / "pages.index"
+    path.write_bytes(b"not a database" * 100)
+    with pytest.raises(sqlite3.Error):
+        Page_Index(str(path))
+
+
+def test_import_images(index):
+    index.add(1, "/scans/0001.jpeg", checksum="abc")
+    assert not index.is_imported()
+    index.import_images([(1, "/scans/0001.jpeg", 10, 1.0), (2, "/scans/0002.jpeg", 20, 2.0)])
+    assert index.is_imported()
+    assert index.get_images(1)[0]["checksum"] == "abc"
+    assert index.get_images(2)[0]["size"] == 20
+
+
+def test_a_failed_import_is_not_marked(index):
+    with pytest.raises(sqlite3.Error):
+        index.import_images([(1, "/scans/0001.jpeg", 10, 1.0), (2, "/scans/0002.jpeg")])
+    assert not index.is_imported()
+    assert index.is_empty()
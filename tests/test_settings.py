@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("appdirs")
+
+from lib import settings  # noqa: E402
+
+
+@pytest.fixture
+def data(monkeypatch):
+    data = {
+        "locale": "en",
+        "on-startup": settings.STARTUP_DO_NOTHING,
+        "recent": ["/scans/b", "/scans/a"],
+        "window-geometry": {"application": [0, 0, 800, 600, False, False]},
+    }
+    monkeypatch.setattr(settings, "_data", data)
+    return data
+
+
+def test_merge_only_takes_changed_keys(data):
+    written = {"locale": "de", "on-startup": settings.STARTUP_OPEN_LAST_PROJECT}
+    merged = settings._merge(written, {"locale"}, [])
+    assert merged == {"locale": "en", "on-startup": settings.STARTUP_OPEN_LAST_PROJECT}
+
+
+def test_merge_keeps_other_windows(data):
+    written = {"window-geometry": {"camera": [10, 10, 300, 200, False, False]}}
+    merged = settings._merge(written, {("window-geometry", "application")}, [])
+    assert merged["window-geometry"] == {
+        "camera": [10, 10, 300, 200, False, False],
+        "application": [0, 0, 800, 600, False, False],
+    }
+
+
+def test_merge_adds_opened_projects_in_front(data):
+    written = {"recent": ["/scans/c", "/scans/a"]}
+    merged = settings._merge(written, {"recent"}, ["/scans/a", "/scans/d"])
+    assert merged["recent"] == ["/scans/d", "/scans/a", "/scans/c"]
+
+
+def test_merge_limits_recent_projects(data):
+    written = {"recent": ["/scans/{0}".format(i) for i in range(settings.CONFIG_RECENTS)]}
+    merged = settings._merge(written, {"recent"}, ["/scans/new"])
+    assert len(merged["recent"]) == settings.CONFIG_RECENTS
+    assert merged["recent"][0] == "/scans/new"
+
+
+def test_merge_replaces_a_broken_entry(data):
+    written = {"window-geometry": None, "recent": "broken"}
+    merged = settings._merge(written, {("window-geometry", "application"), "recent"}, [])
+    assert merged["window-geometry"] == {"application": [0, 0, 800, 600, False, False]}
+    assert merged["recent"] == ["/scans/b", "/scans/a"]
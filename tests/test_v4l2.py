@@ -0,0 +1,184 @@
+import ctypes
+
+import pytest
+
+from lib import v4l2
+
+
+class Fake_Camera:
+    """ Answers the ioctls `v4l2.Device` makes, like a UVC camera would. """
+
+    def __init__(self):
+        self.formats = [v4l2.str_to_fourcc("YUYV"), v4l2.str_to_fourcc("MJPG")]
+        self.framesizes = {
+            self.formats[0]: [(640, 480), (1920, 1080)],
+            self.formats[1]: [(3264, 2448)],
+        }
+        self.controls = [
+            # id, type, name, minimum, maximum, flags
+            (0x00980900, v4l2.CTRL_TYPE_INTEGER, b"Brightness", 0, 255, 0),
+            (0x00980901, v4l2.CTRL_TYPE_INTEGER, b"Contrast", 0, 95, v4l2.CTRL_FLAG_DISABLED),
+            (0x00980918, v4l2.CTRL_TYPE_MENU, b"Power Line Frequency", 0, 2, 0),
+        ]
+        self.menus = {(0x00980918, 0): b"Disabled", (0x00980918, 2): b"60 Hz"}
+        self.values = {0x00980900: 128, 0x00980918: 1}
+        self.rejects_batches = False
+        self.read_only = set()
+        self.requests = []
+
+    def ioctl(self, fd, request, struct, mutate=True):
+        self.requests.append(request)
+        if request == v4l2.VIDIOC_ENUM_FMT:
+            if struct.index >= len(self.formats):
+                raise OSError(22, "EINVAL")
+            struct.pixelformat = self.formats[struct.index]
+        elif request == v4l2.VIDIOC_ENUM_FRAMESIZES:
+            sizes = self.framesizes.get(struct.pixel_format, [])
+            if struct.index >= len(sizes):
+                raise OSError(22, "EINVAL")
+            struct.type = v4l2.FRMSIZE_TYPE_DISCRETE
+            struct.size.discrete.width, struct.size.discrete.height = sizes[struct.index]
+        elif request == v4l2.VIDIOC_QUERYCTRL:
+            self._query(struct)
+        elif request == v4l2.VIDIOC_QUERYMENU:
+            name = self.menus.get((struct.id, struct.index))
+            if name is None:
+                raise OSError(22, "EINVAL")
+            struct.menu.name = name
+        elif request == v4l2.VIDIOC_G_CTRL:
+            struct.value = self.values[struct.id]
+        elif request == v4l2.VIDIOC_S_CTRL:
+            if struct.id in self.read_only:
+                raise OSError(13, "EACCES")
+            self.values[struct.id] = struct.value
+        elif request == v4l2.VIDIOC_S_EXT_CTRLS:
+            if self.rejects_batches:
+                raise OSError(25, "ENOTTY")
+            for i in range(struct.count):
+                self.values[struct.controls[i].id] = struct.controls[i].data.value
+        else:
+            raise OSError(25, "ENOTTY")
+        return 0
+
+    def _query(self, struct):
+        if struct.id & v4l2.CTRL_FLAG_NEXT_CTRL:
+            id = struct.id & ~v4l2.CTRL_FLAG_NEXT_CTRL
+            following = [control for control in self.controls if control[0] > id]
+            if not following:
+                raise OSError(22, "EINVAL")
+            control = following[0]
+        else:
+            matches = [control for control in self.controls if control[0] == struct.id]
+            if not matches:
+                raise OSError(22, "EINVAL")
+            control = matches[0]
+        struct.id, struct.type, struct.name, struct.minimum, struct.maximum, struct.flags = control
+
+
+@pytest.fixture
+def camera(monkeypatch):
+    fake = Fake_Camera()
+    monkeypatch.setattr(v4l2, "ioctl", fake.ioctl)
+    return fake
+
+
+@pytest.fixture
+def device(camera):
+    return v4l2.Device("/dev/video-fake", fd=-1)
+
+
+def test_formats(device, camera):
+    assert list(device.formats()) == [("YUYV", camera.formats[0]), ("MJPG", camera.formats[1])]
+
+
+def test_framesizes(device, camera):
+    assert list(device.framesizes(camera.formats[0])) == [(640, 480), (1920, 1080)]
+    assert list(device.framesizes(v4l2.str_to_fourcc("GREY"))) == []
+
+
+def test_controls_skip_disabled(device):
+    names = [query.name for query in device.controls()]
+    assert names == [b"Brightness", b"Power Line Frequency"]
+
+
+def test_menu_skips_gaps(device):
+    query = device.query_control(0x00980918)
+    assert list(device.menu(query)) == [("Disabled", 0), ("60 Hz", 2)]
+
+
+def test_set_controls_in_one_batch(device, camera):
+    assert device.set_controls({0x00980900: 200, 0x00980918: 2}) == {0x00980900, 0x00980918}
+    assert camera.values == {0x00980900: 200, 0x00980918: 2}
+    assert camera.requests.count(v4l2.VIDIOC_S_EXT_CTRLS) == 1
+    assert v4l2.VIDIOC_S_CTRL not in camera.requests
+
+
+def test_set_controls_falls_back_to_single_ioctls(device, camera):
+    camera.rejects_batches = True
+    camera.read_only.add(0x00980918)
+    assert device.set_controls({0x00980900: 10, 0x00980918: 0}) == {0x00980900}
+    assert camera.values[0x00980900] == 10
+    assert camera.values[0x00980918] == 1
+
+
+def test_set_controls_without_values(device, camera):
+    assert device.set_controls({}) == set()
+    assert camera.requests == []
+
+
+def test_get_control(device):
+    assert device.get_control(0x00980900) == 128
+
+
+@pytest.mark.parametrize("name, var", [
+    ("White Balance Temperature, Auto", "white_balance_temperature_auto"),
+    (b"Brightness", "brightness"),
+    ("  Exposure (Absolute)", "exposure_absolute"),
+    ("Power Line Frequency", "power_line_frequency"),
+])
+def test_name_to_var(name, var):
+    assert v4l2.name_to_var(name) == var
+
+
+def test_fourcc_round_trip():
+    assert v4l2.fourcc_to_str(v4l2.str_to_fourcc("MJPG")) == "MJPG"
+    assert v4l2.str_to_fourcc("YUYV") == 0x56595559
+
+
+@pytest.mark.skipif(ctypes.sizeof(ctypes.c_void_p) != 8, reason="sizes of a 64 bit kernel")
+@pytest.mark.parametrize("struct, size", [
+    (v4l2.fmtdesc, 64),
+    (v4l2.frmsizeenum, 44),
+    (v4l2.format, 208),
+    (v4l2.queryctrl, 68),
+    (v4l2.querymenu, 44),
+    (v4l2.control, 8),
+    (v4l2.ext_control, 20),
+    (v4l2.ext_controls, 32),
+])
+def test_struct_sizes(struct, size):
+    # the sizes are encoded in the ioctl numbers; a wrong one fails with
+    # ENOTTY on a real camera
+    assert ctypes.sizeof(struct) == size
+
+
+@pytest.mark.skipif(ctypes.sizeof(ctypes.c_void_p) != 8, reason="numbers of a 64 bit kernel")
+def test_ioctl_numbers():
+    # from <linux/videodev2.h>
+    assert v4l2.VIDIOC_ENUM_FMT == 0xc0405602
+    assert v4l2.VIDIOC_G_FMT == 0xc0d05604
+    assert v4l2.VIDIOC_G_CTRL == 0xc008561b
+    assert v4l2.VIDIOC_S_CTRL == 0xc008561c
+    assert v4l2.VIDIOC_QUERYCTRL == 0xc0445624
+    assert v4l2.VIDIOC_QUERYMENU == 0xc02c5625
+    assert v4l2.VIDIOC_S_EXT_CTRLS == 0xc0205648
+    assert v4l2.VIDIOC_ENUM_FRAMESIZES == 0xc02c564a
+
+
+def test_a_closed_device_fails_every_request(device, camera, monkeypatch):
+    monkeypatch.setattr(v4l2.os, "close", lambda fd: None)
+    device.close()
+    assert list(device.formats()) == []
+    assert list(device.controls()) == []
+    assert device.get_control(0x00980900) is None
+    assert camera.requests == []
@@ -1,5 +1,7 @@
 import argparse
-from lib import application
+import sys
+
+from lib import trace, version
 
 if __name__ == "__main__":
     def run():
@@ -9,6 +11,28 @@ if __name__ == "__main__":
             help="prints version",
             action="store_true",
         )
+        parser.add_argument(
+            "--headless",
+            help="opens the project without windows; reads commands from stdin and prints JSON lines",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--socket",
+            help="also reads commands from a unix socket at this path (with --headless)",
+            type=str,
+            default=None,
+            metavar="<socket>",
+        )
+        parser.add_argument(
+            "--trace-startup",
+            help="prints how long each startup step took until the window shows",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--profile-startup",
+            help="like --trace-startup, and lists the slowest imports",
+            action="store_true",
+        )
         parser.add_argument(
             "path",
             help="path to project folder to open",
@@ -18,10 +42,21 @@ if __name__ == "__main__":
             metavar="<path>",
         )
         args = parser.parse_args()
+        if args.profile_startup:
+            trace.profile_imports()
+        elif args.trace_startup:
+            trace.enable()
 
+        # import only what a mode needs; headless never loads GTK
         if args.version:
-            print("%s %s" % (parser.prog, application.version))
+            print("%s %s" % (parser.prog, version))
+        elif args.headless:
+            if not args.path:
+                parser.error("--headless needs a project path")
+            from lib import headless
+            sys.exit(headless.run(args.path, args.socket))
         else:
+            from lib import application
             application.run(args.path)
 
     run()
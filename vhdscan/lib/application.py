@@ -1,8 +1,9 @@
 import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Gdk
+from os.path import realpath
 
-from . import locale, settings, udev
+from . import locale, postprocess, settings, trace, udev, ui
 
 from .camera_ui import Camera_UI
 from .application_ui import Application_UI
@@ -10,7 +11,6 @@ from .open_dialog import Open_Dialog
 from .project_ui import Project_UI
 from .settings_ui import Settings_UI
 
-version = "0.3"
 application_ui = None
 project_ui = None
 open_dialog = None
@@ -49,22 +49,32 @@ def quit(*args):
     project_ui.destroy()
     camera_ui.destroy()
     settings_ui.destroy()
+    settings.flush()
+    postprocess.shutdown()
     Gtk.main_quit()
 
 
 def run(path):
+    trace.mark("imported")
+    # lists the cameras while the window builds
+    udev.start()
     settings.load()
+    trace.mark("loaded settings")
 
     add_stylesheet("css/vhdscan.css")
 
     global application_ui, project_ui, open_dialog, camera_ui, settings_ui
     application_ui = Application_UI("application", quit)
-    project_ui = Project_UI("project")
+    trace.mark("built Application_UI")
+    # dialogs parse their Glade file when first shown
+    project_ui = ui.Lazy_Window(Project_UI, "project")
     open_dialog = Open_Dialog()
-    camera_ui = Camera_UI("camera")
-    settings_ui = Settings_UI("settings")
+    camera_ui = ui.Lazy_Window(Camera_UI, "camera")
+    settings_ui = ui.Lazy_Window(Settings_UI, "settings")
 
     locale.load(settings.get("locale"))
+    trace.mark("loaded locale")
+    application_ui.root.connect("draw", _first_draw)
     application_ui.show()
 
     if path:
@@ -72,4 +82,12 @@ def run(path):
     else:
         application_ui.maybe_open_recent()
 
+    trace.mark("opened project")
     Gtk.main()
+
+
+# handler: application_ui.root::draw
+def _first_draw(*args):
+    application_ui.root.disconnect_by_func(_first_draw)
+    trace.mark("drew first window")
+    trace.report()
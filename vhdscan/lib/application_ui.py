@@ -1,7 +1,8 @@
 from gi.repository import Gtk, Gdk, GdkPixbuf, GLib, GObject, Pango
 import re
-from os.path import isfile as is_file, join as join_path
-from . import application, camera, settings, project, ui
+import time
+from os.path import basename, isfile as is_file
+from . import application, camera, motion, settings, project, udev, ui, writer
 from .locale import _
 from .project import Project
 from .camera import Camera
@@ -22,9 +23,20 @@ class Application_UI(ui.Window):
         self.camera_2 = None
         self._updating_ui = False
         self._autostart_feed_id = None
+        self._autostart_standby_id = None
+        self._udev_ready_id = None
+        self._switch_tick = None
+        self._still_page = None
+        self._still_advance = False
+        self.switch_latency = None
+        self._updating_zoom = False
+        self._frame_size = None
         self._status_messages = {}
         self._error_messages = {}
 
+        self.writer = writer.Image_Writer()
+        self.writer.connect("job", self.update_job_status)
+
         # let's have some shortcuts
         self.set_frame = self.output_frame.set_from_pixbuf
         self.get_frame = self.output_frame.get_pixbuf
@@ -39,6 +51,21 @@ class Application_UI(ui.Window):
         self.close_btn.connect("clicked", self.close_project)
         self.camera_btn.connect("clicked", self.setup_camera)
         self.settings_btn.connect("clicked", self.show_settings)
+        self.missing_btn.connect("clicked", self.goto_next_missing_page)
+        self.zoom_in_btn.connect("clicked", self.zoom_in)
+        self.zoom_out_btn.connect("clicked", self.zoom_out)
+        self.zoom_fit_btn.connect("clicked", self.zoom_fit)
+        self.zoom_original_btn.connect("clicked", self.zoom_original)
+        self.output_scroll.connect("size-allocate", self.output_resized)
+
+        self.auto_btn = Gtk.ToggleButton()
+        self.auto_btn.connect("toggled", self.toggle_auto_capture)
+        self.top_toolbar.pack_end(self.auto_btn)
+        self.auto_btn.show()
+
+        self.capture_label = ui.Label()
+        self.bottom_toolbar.pack_end(self.capture_label)
+        self.capture_label.show()
 
         self.current_page_adjustment = Gtk.Adjustment(
             value=1,
@@ -69,12 +96,23 @@ class Application_UI(ui.Window):
 
     def destroy(self):
         if self.project:
-            self.camera.stop()
+            self.camera_1.cancel_recovery()
+            self.camera_2.cancel_recovery()
+            self.camera_1.stop()
+            self.camera_2.stop()
+        self.writer.flush()
+        if self.project:
+            self.writer.index = None
+            self.project.close()
         super().destroy()
 
     def update_translation(self, *args):
         self.update_title()
         self.save_label.set_label(_("Take Image"))
+        self.missing_btn.set_label(_("Next Missing Page"))
+        self.missing_btn.set_tooltip_text(_("Go to the next page without an image"))
+        self.auto_btn.set_label(_("Auto"))
+        self.auto_btn.set_tooltip_text(_("Take an image whenever the page holds still after it was turned"))
         self.new_btn.set_tooltip_text(_("New Project"))
         self.open_btn.set_tooltip_text(_("Open Project"))
         self.edit_btn.set_tooltip_text(_("Edit Project"))
@@ -94,6 +132,7 @@ class Application_UI(ui.Window):
             camera.IDLE: _("The camera is ready."),
             camera.INIT: _("Starting camera..."),
             camera.FEED: _("Feeding images"),
+            camera.RECOVER: _("Waiting for the camera to come back..."),
             camera.SETUP_ERROR: _("Could not setup camera."),
             camera.INIT_ERROR: _("Could not start camera feed."),
             camera.FEED_ERROR: _("Could not feed camera images."),
@@ -107,7 +146,7 @@ class Application_UI(ui.Window):
             camera.E_CAMERA_IO: _("Could not read frame from camera device. The camera might be disconnected."),
             camera.E_NO_RESOLUTION: _("Could not set camera device because the device does not provide a resolution."),
             camera.E_NO_RESOLUTIONS: _("Could not set camera device because the device does not provide any image resolutions."),
-            camera.E_BANDWIDTH: _("Could not start camera feed because there is already an active feed."),
+            camera.E_BANDWIDTH: _("Could not start camera feed because the USB bus does not have enough bandwidth left."),
         }
 
     def update_ui(self, *args, **kwargs):
@@ -117,12 +156,14 @@ class Application_UI(ui.Window):
 
         self.update_title()
         self.save_btn.set_sensitive(False)
+        self.auto_btn.set_sensitive(self.project is not None)
         if self.project:
             self.edit_btn.set_sensitive(True)
             self.camera_btn.set_sensitive(True)
             self.close_btn.set_sensitive(True)
             self.current_page_adjustment.set_upper(self.project.total_pages)
             self.current_page_adjustment.set_value(self.project.current_page)
+            self.update_progress_label()
             self.bottom_toolbar.show()
             self.navigation_box.set_sensitive(False)
             self.zoom_box.set_sensitive(False)
@@ -130,7 +171,7 @@ class Application_UI(ui.Window):
             zoom_level = self.project.zoom_level
             if not zoom_level:
                 zoom_level = ZOOM_DEFAULT
-            self.zoom_adjustment.set_value(zoom_level)
+            self.set_zoom(zoom_level, self.project.zoom_mode)
 
         else:
             self.edit_btn.set_sensitive(False)
@@ -143,20 +184,100 @@ class Application_UI(ui.Window):
         self._updating_ui = False
 
     def switch_camera(self, *args):
-        self.camera.stop()
+        previous = self.camera
         self._switch_camera()
-        self.camera.start()
+        if previous is self.camera:
+            return
+
+        if self.camera.detector:
+            # the second page of a spread is already open; the first needs a turn
+            self.camera.detector.reset(require_motion=self.is_left_page())
+
+        # measured until the first frame in `render_feed`
+        self._switch_tick = time.monotonic()
+        previous.set_standby(True)
+        if not self.camera.start():
+            # both feeds do not fit the bus; fall back to a cold switch
+            previous.stop()
+            self.camera.start()
+        self.camera_status_changed(self.camera, self.camera.status)
+
+    def is_left_page(self):
+        return self.project.current_page % 2 == 1
 
     def _switch_camera(self):
-        is_left = self.project.current_page % 2 == 1
+        is_left = self.is_left_page()
         self.camera = self.camera_1 if is_left else self.camera_2
+        self.update_preview_scale()
 
     # handler
     def update_zoom_label(self, *args):
         zoom = int(self.zoom_adjustment.get_value())
         self.zoom_label.set_label("{0}%".format(zoom))
+        if not self.project:
+            return
+        if not self._updating_zoom:
+            self.project.zoom_mode = ZOOM_MANUAL
         self.project.zoom_level = zoom
         self.project.save()
+        self.update_preview_scale()
+
+    def set_zoom(self, zoom, mode=ZOOM_MANUAL):
+        self.project.zoom_mode = mode
+        self._updating_zoom = True
+        self.zoom_adjustment.set_value(zoom)
+        self._updating_zoom = False
+
+    # handler: zoom_in_btn::clicked
+    def zoom_in(self, *args):
+        step = self.zoom_adjustment.get_page_increment()
+        self.set_zoom(self.zoom_adjustment.get_value() + step)
+
+    # handler: zoom_out_btn::clicked
+    def zoom_out(self, *args):
+        step = self.zoom_adjustment.get_page_increment()
+        self.set_zoom(self.zoom_adjustment.get_value() - step)
+
+    # handler: zoom_fit_btn::clicked
+    def zoom_fit(self, *args):
+        self.project.zoom_mode = ZOOM_FIT
+        self.update_preview_scale()
+
+    # handler: zoom_original_btn::clicked
+    def zoom_original(self, *args):
+        self.set_zoom(ZOOM_DEFAULT, ZOOM_ORIGINAL)
+
+    # handler: output_scroll::size-allocate
+    def output_resized(self, *args):
+        if self.project and self.project.zoom_mode == ZOOM_FIT:
+            self.update_preview_scale()
+
+    def get_fit_scale(self):
+        if not self._frame_size:
+            return None
+        width, height = self._frame_size
+        allocation = self.output_scroll.get_allocation()
+        if allocation.width < 2 or allocation.height < 2:
+            return None
+        return min(allocation.width / width, allocation.height / height)
+
+    def update_preview_scale(self):
+        """ Tells the camera at which size the viewport shows its frames. """
+
+        if not self.project or not self.camera:
+            return
+
+        if self.project.zoom_mode == ZOOM_FIT:
+            scale = self.get_fit_scale()
+            if scale is None:
+                return
+            zoom = int(scale * 100)
+            if zoom != int(self.zoom_adjustment.get_value()):
+                self.set_zoom(zoom, ZOOM_FIT)
+        else:
+            scale = self.zoom_adjustment.get_value() / 100
+
+        self.camera.set_preview_scale(scale)
 
     # handler
     def current_page_changed(self, *args):
@@ -171,10 +292,18 @@ class Application_UI(ui.Window):
 
     def update_progress_label(self):
         if self.project:
-            total = self.project.total_pages
-            current = self.project.current_page
-            progress = int(100 * current / total)
+            # counted in the index; listing a large project folder is slow
+            taken, total = self.project.get_progress()
+            progress = int(100 * taken / total)
             self.progress_label.set_label("{0}%".format(progress))
+            self.progress_label.set_tooltip_text(_("{0} of {1} pages taken").format(taken, total))
+            self.missing_btn.set_sensitive(taken < total)
+
+    # handler: missing_btn::clicked
+    def goto_next_missing_page(self, *args):
+        page = self.project.get_next_missing_page()
+        if page is not None:
+            self.current_page_adjustment.set_value(page)
 
     def update_current_page_label(self):
         if self.project:
@@ -198,47 +327,131 @@ class Application_UI(ui.Window):
             self.set_title(_("VHD Scan - {0}").format(name))
 
     # hander
-    def save_current_image(self, *args):
-        pixbuf = self.get_frame()
-        if not pixbuf:
+    def save_current_image(self, *args, advance=False):
+        # the frame arrives with `camera::still`; remember its page
+        self._still_page = self.project.current_page
+        self._still_advance = advance
+        if self.camera.capture_still():
+            self.save_btn.set_sensitive(False)
+        else:
+            self._still_page = None
+
+    # handler: camera::still
+    def still_captured(self, cam, frame, latency):
+        # may be emitted from the feed thread; save on the main loop
+        page = self._still_page
+        if page is None:
+            page = self.project.current_page
+        GLib.idle_add(self._save_still, cam, frame, latency, page, self._still_advance)
+        self._still_page = None
+        self._still_advance = False
+
+    # handler: auto_btn::toggled
+    def toggle_auto_capture(self, *args):
+        is_active = self.auto_btn.get_active()
+        for cam in (self.camera_1, self.camera_2):
+            if cam:
+                cam.set_detector(motion.Stillness_Detector() if is_active else None)
+
+    # handler: camera::settled
+    def page_settled(self, cam, frame):
+        GLib.idle_add(self._auto_capture, cam)
+
+    def _auto_capture(self, cam):
+        if cam is not self.camera or not self.auto_btn.get_active():
             return
+        if self._still_page is not None or not self.save_btn.get_sensitive():
+            # still busy with the previous page
+            return
+        self.save_current_image(advance=True)
+
+    def advance_page(self, page):
+        if page != self.project.current_page:
+            # the operator moved on already
+            return
+        if page < self.project.total_pages:
+            self.current_page_adjustment.set_value(page + 1)
+        else:
+            self.auto_btn.set_active(False)
 
-        details = self.project.get_current_image_filename()
+    def _save_still(self, cam, frame, latency, page, advance):
+        if not self.project:
+            # the project was closed while the still was taken
+            return
+        self.update_save_btn()
+        if cam.preview_resolution:
+            self.capture_label.set_label(_("Switched resolution in {0} ms").format(int(latency * 1000)))
+
+        if frame is None:
+            self.capture_label.set_label(_("Could not take image."))
+            return
+
+        details = self.project.get_image_filename(page)
         path = details["path"]
         do_save = False
-        if not is_file(path):
+        if not self.project.is_taken(details["filename"]):
             do_save = True
 
         else:
             duplicate_handle = self.project.duplicate_handle
-            if duplicate_handle == "ask":
-                do_save = ui.ask(_("Replace image file?"))
+            if duplicate_handle == project.DUPLICATE_ASK:
+                do_save = ui.ask(_("Replace image file?"), _("Image exists"))
 
-            elif duplicate_handle == "replace":
+            elif duplicate_handle == project.DUPLICATE_OVERWRITE:
                 do_save = True
 
-            elif duplicate_handle == "suffix":
-                i = 0
-                while True:
-                    i += 1
-                    filename = "%s (%d).%s" % (details["basename"], i, details["format"])
-                    _path = join_path(details["dirname"], filename)
-                    if not is_file(_path):
-                        path = _path
-                        do_save = True
-                        break
+            elif duplicate_handle == project.DUPLICATE_SUFFIX:
+                details = self.project.get_free_image_filename(page)
+                path = details["path"]
+                do_save = True
 
         if do_save:
             format = details["format"]
-            if format == "jpeg":
-                quality = str(self.project.jpeg_quality)
-                pixbuf.savev(path, "jpeg", ["quality"], [quality])
-            elif format == "tiff":
-                compression = str(self.project.tiff_compression)
-                pixbuf.savev(path, "tiff", ["compression"], [compression])
-            elif format == "png":
-                compression = str(self.project.png_compression)
-                pixbuf.savev(path, "png", ["compression"], [compression])
+            options = self.project.get_image_options(format)
+            # `frame` is the untouched full resolution BGR frame
+            job = writer.Job(path, frame, format, options)
+            job.page = page
+            job.slot = cam.slot
+            job.setup = cam.save()
+            job.stages = self.project.postprocess
+            if cam.is_still_blurry():
+                job.warning = _("The image looks blurry. Please check it.")
+            if not self.writer.submit(job):
+                self.capture_label.set_label(_("The image queue is full; the image was not saved."))
+                self.update_save_btn()
+                return
+            self.project.take_filename(basename(path))
+            self.update_save_btn()
+            if advance:
+                self.advance_page(page)
+
+    def update_save_btn(self):
+        # hold back captures while the writer queue is full
+        can_save = self.camera is not None and self.camera.status == camera.FEED
+        self.save_btn.set_sensitive(can_save and not self.writer.is_full())
+
+    # handler: writer::job
+    def update_job_status(self, _writer, job):
+        filename = basename(job.path)
+        if job.status == writer.JOB_QUEUED:
+            text = _("{0} queued").format(filename)
+        elif job.status == writer.JOB_WRITING:
+            text = _("Saving {0}...").format(filename)
+        elif job.status == writer.JOB_DONE:
+            text = _("Saved {0} in {1} ms").format(filename, int(job.duration * 1000))
+        else:
+            text = _("Could not save {0}").format(filename)
+            if self.project and not is_file(job.path):
+                self.project.release_filename(filename)
+        count = self.writer.count()
+        if count > 0:
+            text += " " + _("({0} waiting)").format(count)
+        if job.warning:
+            text += " " + job.warning
+        self.capture_label.set_label(text)
+        self.update_save_btn()
+        if job.status == writer.JOB_DONE and self.project:
+            self.update_progress_label()
 
     def show_project_error(self, _noop, code):
         if code == project.E_CREATE_FILE_EXISTS:
@@ -253,11 +466,24 @@ class Application_UI(ui.Window):
         elif code == project.E_OPEN_UNUSABLE:
             ui.warn(_("The project appears to be broken and can not be opened."), _("Broken project"))
 
+        elif code == project.E_SAVE_FAILED:
+            ui.warn(_("The project could not be saved. Please check the project folder."), _("Can not save project"))
+
     def show_camera_error(self, cam, code):
-        self.set_error_text(self._error_messages[code])
+        self.set_error_text(self.get_error_message(cam))
+
+    def get_error_message(self, cam):
+        message = self._error_messages[cam.error]
+        if cam.error == camera.E_BANDWIDTH:
+            if cam.suggestion:
+                message += " " + _("Try {0} instead.").format(cam.suggestion.name)
+            else:
+                message += " " + _("Try a smaller resolution or the MJPG format.")
+        return message
 
     def camera_status_changed(self, cam, status):
         if cam is self.camera:
+            self.update_save_btn()
             if status == camera.FEED:
                 self.status_box.hide()
                 self.output_scroll.show()
@@ -268,9 +494,22 @@ class Application_UI(ui.Window):
                 if status < 0:
                     self.set_status_icon(ui.ERROR_48)
                     self.error_text.show()
-                    self.set_error_text(self._error_messages[cam.error])
+                    self.set_error_text(self.get_error_message(cam))
                 self.set_status_text(self._status_messages[status])
 
+    # handler: camera::recovered
+    def camera_recovered(self, cam, duration):
+        text = _("The camera was back after {0} s").format(round(duration, 1))
+        self.capture_label.set_label(text)
+
+    # handler: camera::stalled
+    def camera_stalled(self, cam, elapsed):
+        if cam is not self.camera:
+            return
+        # the preview still shows the last frame; say that it is old
+        text = _("The camera sent no image for {0} s. Reopening it...").format(round(elapsed, 1))
+        self.capture_label.set_label(text)
+
     def _init_project(self):
         project = Project()
         project.connect("error", self.show_project_error)
@@ -278,6 +517,7 @@ class Application_UI(ui.Window):
 
     def _run_project(self, p):
         self.project = p
+        self.writer.index = p.index
         settings.add_recent(self.project)
         camera.set_fps(self.project.fps)
         self.update_ui()
@@ -285,23 +525,55 @@ class Application_UI(ui.Window):
         self.camera_1 = Camera(camera.LEFT)
         self.camera_1.connect("status", self.camera_status_changed)
         self.camera_1.connect("feed", self.render_feed)
+        self.camera_1.connect("still", self.still_captured)
+        self.camera_1.connect("settled", self.page_settled)
+        self.camera_1.connect("recovered", self.camera_recovered)
+        self.camera_1.connect("stalled", self.camera_stalled)
         self.camera_2 = Camera(camera.RIGHT)
         self.camera_2.connect("status", self.camera_status_changed)
         self.camera_2.connect("feed", self.render_feed)
+        self.camera_2.connect("still", self.still_captured)
+        self.camera_2.connect("settled", self.page_settled)
+        self.camera_2.connect("recovered", self.camera_recovered)
+        self.camera_2.connect("stalled", self.camera_stalled)
 
+        self.toggle_auto_capture()
         self._switch_camera()
         self._autostart_feed_id = self.camera.connect("ready", self._autostart_feed)
+        standby_camera = self.camera_2 if self.camera is self.camera_1 else self.camera_1
+        self._autostart_standby_id = standby_camera.connect("ready", self._autostart_standby)
 
+        if udev.is_ready():
+            self._apply_setups()
+        else:
+            # the cameras are still being listed in the background
+            self._udev_ready_id = udev.connect("ready", self._apply_setups)
+
+    # handler: udev::ready
+    def _apply_setups(self, *args):
+        if self._udev_ready_id:
+            udev.disconnect(self._udev_ready_id)
+            self._udev_ready_id = None
         self.camera_1.set_setup(self.project.setup_1)
         self.camera_2.set_setup(self.project.setup_2)
 
     # handler: camera::ready
     def _autostart_feed(self, cam, *args):
-        cam.start()
+        # the page may have turned while the camera was set up
+        cam.start(standby=cam is not self.camera)
         self.navigation_box.set_sensitive(True)
+        self.zoom_box.set_sensitive(True)
         cam.disconnect(self._autostart_feed_id)
         self._autostart_feed_id = None
 
+    # handler: camera::ready
+    def _autostart_standby(self, cam, *args):
+        # pre-open the other page's camera so turning the page is instant.
+        # If the page turned to it meanwhile, it was not ready to start then
+        cam.start(standby=cam is not self.camera)
+        cam.disconnect(self._autostart_standby_id)
+        self._autostart_standby_id = None
+
     # handler: new_btn::clicked
     def create_project(self, *args):
         project_data = application.project_ui.show()
@@ -342,8 +614,19 @@ class Application_UI(ui.Window):
 
     # handle: close_btn::clicked
     def close_project(self, *args):
+        if self._udev_ready_id:
+            udev.disconnect(self._udev_ready_id)
+            self._udev_ready_id = None
         if self.project:
-            self.camera.stop()
+            self.camera_1.cancel_recovery()
+            self.camera_2.cancel_recovery()
+            self.writer.flush()
+            self.writer.index = None
+            self.project.close()
+            # stops the feeds and releases the device, its control writer and
+            # the claim on it
+            self.camera_1.reset()
+            self.camera_2.reset()
             self.camera_1 = None
             self.camera_2 = None
             self.camera = None
@@ -368,5 +651,20 @@ class Application_UI(ui.Window):
         application.settings_ui.show()
 
     # handler: camera::feed
-    def render_feed(self, camera, pixbuf, *args):
+    def render_feed(self, camera, pixbuf, width, height):
+        if camera is not self.camera:
+            # a frame that was on its way before the page turned
+            return
         self.set_frame(pixbuf)
+        if self._switch_tick is not None:
+            self.switch_latency = time.monotonic() - self._switch_tick
+            self._switch_tick = None
+            GLib.idle_add(self.show_switch_latency)
+        if self._frame_size != (width, height):
+            # the camera resolution changed; a fitted zoom needs updating
+            self._frame_size = (width, height)
+            GLib.idle_add(self.output_resized)
+
+    def show_switch_latency(self):
+        text = _("Switched camera in {0} ms").format(int(self.switch_latency * 1000))
+        self.capture_label.set_label(text)
@@ -0,0 +1,107 @@
+from threading import Lock
+
+
+# average bytes per pixel of a frame in each pixelformat
+BYTES_PER_PIXEL = {
+    "YUYV": 2,
+    "YUY2": 2,
+    "UYVY": 2,
+    "YU12": 1.5,
+    "YV12": 1.5,
+    "NV12": 1.5,
+    "NV21": 1.5,
+    "RGB3": 3,
+    "BGR3": 3,
+    "GREY": 1,
+    # compressed formats; a conservative guess for printed pages
+    "MJPG": 0.5,
+    "JPEG": 0.5,
+    "H264": 0.1,
+}
+DEFAULT_BYTES_PER_PIXEL = 2
+
+# isochronous share of a bus that streams may use, in bytes per second,
+# keyed by link speed in Mbit/s; USB reserves 20% for control transfers
+BUS_BUDGETS = {
+    12: 0.8 * 12e6 / 8,
+    480: 0.8 * 480e6 / 8,
+    5000: 0.8 * 5000e6 / 8,
+}
+DEFAULT_BUS_SPEED = 480
+
+# a single high-bandwidth isochronous endpoint moves 3 x 1024 bytes per
+# 125 µs microframe; no UVC camera on a USB 2 link gets more than this
+ENDPOINT_LIMIT = 3 * 1024 * 8000
+
+_lock = Lock()
+_streams = {}
+
+
+def estimate(resolution, fps):
+    """ Returns the bytes per second a resolution needs at `fps`. """
+
+    bytes_per_pixel = BYTES_PER_PIXEL.get(resolution.pixelformat, DEFAULT_BYTES_PER_PIXEL)
+    return resolution.width * resolution.height * bytes_per_pixel * fps
+
+
+def get_budget(device):
+    """ Returns the bytes per second available on the device's bus. """
+
+    speed = device.speed or DEFAULT_BUS_SPEED
+    # a USB 2 camera on a USB 3 port still shares the USB 2 bus
+    speeds = [s for s in BUS_BUDGETS if s <= speed] or [min(BUS_BUDGETS)]
+    return BUS_BUDGETS[max(speeds)]
+
+
+def get_used(bus, exclude=None):
+    return sum(
+        rate for camera, (_bus, rate) in _streams.items()
+        if _bus == bus and camera is not exclude
+    )
+
+
+def fits(device, resolution, fps, exclude=None):
+    rate = estimate(resolution, fps)
+    if (device.speed or DEFAULT_BUS_SPEED) <= 480 and rate > ENDPOINT_LIMIT:
+        return False
+    return get_used(device.bus, exclude) + rate <= get_budget(device)
+
+
+def reserve(camera, resolution, fps):
+    """ Books bandwidth for a feed; returns `False` if the bus is full. """
+
+    device = camera.device
+    with _lock:
+        if not fits(device, resolution, fps, exclude=camera):
+            return False
+        _streams[camera] = (device.bus, estimate(resolution, fps))
+    return True
+
+
+def release(camera):
+    with _lock:
+        _streams.pop(camera, None)
+
+
+def suggest(camera, fps):
+    """ Returns the resolution closest to the camera's stream resolution that
+    fits the bus next to the other feeds, preferring the same size in a
+    compressed format. Returns `None` if nothing fits. """
+
+    device = camera.device
+    current = camera.get_stream_resolution()
+    current_pixels = current.width * current.height
+
+    def rank(resolution):
+        pixels = resolution.width * resolution.height
+        return (pixels != current_pixels, abs(current_pixels - pixels))
+
+    with _lock:
+        candidates = [
+            resolution for resolution in camera.resolutions.values()
+            if resolution.width * resolution.height <= current_pixels
+            and fits(device, resolution, fps, exclude=camera)
+        ]
+    if not candidates:
+        return None
+    return min(candidates, key=rank)
@@ -1,10 +1,9 @@
-import cv2 as opencv2
-import re
-import subprocess
+import logging
+import time
 
-from gi.repository import GObject, GdkPixbuf
-from threading import Event, Thread
-from . import setup, udev
+from gi.repository import GLib, GObject
+from threading import Condition, Event, RLock, Thread
+from . import bandwidth, capabilities, focus, frame as framebuffer, setup, udev, v4l2
 
 
 # camera status
@@ -16,6 +15,8 @@ SETUP = 1
 IDLE = 2
 INIT = 3
 FEED = 4
+# the feed broke down; waiting for the device to come back
+RECOVER = 5
 
 # error codes
 E_OK = 0
@@ -37,27 +38,30 @@ CONTROL_INT = 1
 CONTROL_BOOL = 2
 CONTROL_MENU = 3
 
+# frames to read at most until the device delivers the still resolution
+STILL_ATTEMPTS = 10
 
-def sh(*commands):
-    try:
-        lines = subprocess.run(
-            commands,
-            check=True,
-            universal_newlines=True,
-            stdout=subprocess.PIPE,
-        ).stdout.split("\n")
-    except subprocess.CalledProcessError:
-        lines = []
-    return lines
+# recent frames a still is picked from, by sharpness
+BURST_SIZE = 5
+# frames read at the still resolution when it differs from the preview
+STILL_BURST = 3
 
+# failed reads in a row before a feed counts as broken
+READ_RETRIES = 3
+READ_RETRY_DELAY = 0.2
 
-def regex(pattern, string, group=1, flags=0):
-    if not type(group) is list:
-        group = [group]
-    match = re.search(pattern, string, flags)
-    if match:
-        return match.group(*group)
-    return None
+# reopening a device that is still plugged in after its feed broke
+RECOVER_DELAY = 1.0
+RECOVER_ATTEMPTS = 5
+
+# seconds without a frame before a running feed counts as stalled
+STALL_TIMEOUT = 2.0
+STALL_CHECK_INTERVAL = 0.5
+
+# seconds a new feed waits for the previous one to release the device
+RELEASE_TIMEOUT = 2.0
+
+logger = logging.getLogger(__name__)
 
 
 def set_fps(n):
@@ -72,7 +76,8 @@ class Resolution:
         self.height = int(height)
         self.pixelformat = str(pixelformat)
         self.name = "[{0}] {1}x{2}".format(pixelformat, width, height)
-        self.fourcode = opencv2.VideoWriter_fourcc(*pixelformat)
+        # same as `cv2.VideoWriter_fourcc()`, without loading OpenCV
+        self.fourcode = v4l2.str_to_fourcc(self.pixelformat)
         self.value = self.stringify(width, height, pixelformat)
 
     @staticmethod
@@ -82,7 +87,8 @@ class Resolution:
 
 class Control:
 
-    def __init__(self, type, name, value, camera, min=0, max=0, step=0, default=0, inactive=False):
+    def __init__(self, type, name, value, camera, id=0, min=0, max=0, step=0, default=0, inactive=False):
+        self.id = id
         self.name = name
         self.value = int(value)
         self.min = int(min)
@@ -103,13 +109,127 @@ class Control:
 
     def set_sensitive(self, is_sensitive):
         if self.struct:
-            for input in self.struct.inputs:
+            for input in self.struct["inputs"]:
                 input.set_sensitive(is_sensitive)
 
+    def save(self):
+        return {
+            "type": self.type,
+            "id": self.id,
+            "name": self.name,
+            "value": self.value,
+            "min": self.min,
+            "max": self.max,
+            "step": self.step,
+            "default": self.default,
+            "inactive": self.inactive,
+            "values": [list(value) for value in self.values],
+        }
+
+
+def new_control_from_data(data, camera):
+    control = Control(
+        type=data["type"],
+        id=data["id"],
+        name=data["name"],
+        value=data["value"],
+        min=data["min"],
+        max=data["max"],
+        step=data["step"],
+        default=data["default"],
+        inactive=data["inactive"],
+        camera=camera,
+    )
+    for text, value in data["values"]:
+        control.add_value(text, value)
+    return control
+
+
+class Control_Writer:
+    """ Applies control changes on a single thread. Changes that pile up
+    while a batch is written are coalesced; the latest value wins. Values a
+    control has already are dropped here, where `Control.value` is current. """
+
+    def __init__(self, camera, device):
+        self._camera = camera
+        self._device = device
+        self._pending = {}
+        self._is_closed = False
+        self._condition = Condition()
+        self._thread = Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def write(self, control, value):
+        with self._condition:
+            if self._is_closed:
+                return False
+            self._pending[control.name] = (control, value)
+            self._condition.notify_all()
+        return True
+
+    def close(self):
+        with self._condition:
+            self._is_closed = True
+            self._pending = {}
+            self._condition.notify_all()
+
+    # thread target
+    def _write(self):
+        names = []
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._is_closed)
+                if self._is_closed:
+                    return
+                batch = self._pending
+                self._pending = {}
+
+            values = {}
+            for control, value in batch.values():
+                if int(value) != control.value:
+                    values[control.id] = value
+            applied = self._device.set_controls(values)
+            for control, value in batch.values():
+                if control.id in applied:
+                    control.value = int(value)
+                    names.append(control.name)
+
+            with self._condition:
+                is_idle = not self._pending
+
+            if is_idle and names:
+                # the last requested values have taken effect
+                self._camera.emit("controls", names)
+                names = []
+
+
+class Feed:
+    """ The state of one started feed. A buffer thread that outlives its
+    feed, e.g. stuck in a read, only ever touches its own. """
+
+    def __init__(self, previous=None):
+        self.interrupt = Event()
+        # decoded frames with their capture times; the preview and stills
+        # read from here without copying
+        self.ring = framebuffer.Frame_Ring()
+        # the buffer thread of the feed before, which holds the device
+        self.previous = previous
+        self.reopen_requested = Event()
+        # `time.monotonic()` of the last frame read
+        self.frame_tick = None
+        # `time.time()` the current stall began, until a frame arrives
+        self.stall = None
+        # start a new feed in this standby state once this one ended
+        self.restart = None
+        # set by the first frame; a recovery only ends there
+        self.has_frame = False
+
+    def is_interrupted(self):
+        return self.interrupt.is_set()
+
 
 class Camera(GObject.Object):
 
-    _global_thread = None
     fps = 15
 
     __gsignals__ = {
@@ -119,7 +239,14 @@ class Camera(GObject.Object):
         "stop": (GObject.SignalFlags.RUN_FIRST, None, ()),
         "status": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
         "error": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
-        "feed": (GObject.SignalFlags.RUN_FIRST, None, (object, object, object,))
+        "feed": (GObject.SignalFlags.RUN_FIRST, None, (object, object, object,)),
+        "still": (GObject.SignalFlags.RUN_FIRST, None, (object, object,)),
+        "controls": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        "settled": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        # seconds the feed was down
+        "recovered": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        # seconds since the last frame
+        "stalled": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
     }
 
     _error_to_name = {
@@ -143,6 +270,7 @@ class Camera(GObject.Object):
         FEED: "feed",
         FEED_ERROR: "feed-error",
         IDLE: "idle",
+        RECOVER: "recover",
     }
 
     def __init__(self, slot=None):
@@ -150,22 +278,75 @@ class Camera(GObject.Object):
         self.slot = slot
         self.device = None
         self.status = UNSET
+        self.preview_scale = 1.0
+        # without a preview no feed thread converts frames for `feed`
+        self.has_preview = True
+        # a `motion.Stillness_Detector` that sees every decoded frame
+        self.detector = None
+        # failed reads to retry before a feed counts as broken
+        self.read_retries = READ_RETRIES
+        # reopen a broken feed by itself, also after the device was replugged
+        self.can_recover = True
+        # `(time.time(), seconds)` of every outage the feed recovered from
+        self.outages = []
+        # seconds without a frame before the capture is reopened
+        self.stall_timeout = STALL_TIMEOUT
+        # `(time.time(), seconds)` of every stall of a running feed
+        self.stalls = []
+        self._recovery = None
+        self._is_recovering_setup = False
+        # the buffer thread of the last feed, kept across resets; the next
+        # feed waits for it to release the device
+        self._buffer_thread = None
+        self._feed_thread = None
+        # guards replacing and stopping `_feed` between threads
+        self._feed_lock = RLock()
+        self._feed = None
         self._reset()
 
     def _reset(self):
         self.stop()
         if self.device:
-            self.device.in_use = False
+            udev.release(self.device)
         self.device = None
         self.controls = {}
+        if getattr(self, "_control_writer", None):
+            self._control_writer.close()
+        self._control_writer = None
+        if getattr(self, "_v4l2", None):
+            self._v4l2.close()
+        self._v4l2 = None
         self.resolution = None
+        self.preview_resolution = None
         self.resolutions = {}
+        self.still_latency = None
+        self.still_sharpness = None
+        self._still_requested = Event()
         self.error = E_OK
-        self._frame = None
-        self._feed_interrupt = False
-        self._feed_thread = False
-        self._buffer_thread = False
+        # the ring of the current feed
+        self.ring = framebuffer.Frame_Ring()
+        self._reset_counters()
+        self._feed = None
+        self._is_feeding = False
         self._is_threading = False
+        # streaming without decoding or previewing frames
+        self.is_standby = False
+        # a resolution that fits the bus after `E_BANDWIDTH`
+        self.suggestion = None
+
+    def _reset_counters(self):
+        self.ring.clear()
+        # frames converted and emitted as `feed`
+        self.frames_shown = 0
+        # frames the preview never showed because a newer one arrived first
+        self.frames_skipped = 0
+        # preview ticks without a new frame; these used to re-emit the last one
+        self.frames_duplicated = 0
+
+    @property
+    def frames_captured(self):
+        # frames read from the device; doubles as the frame sequence number
+        return self.ring.seq
 
     def reset(self):
         self._reset()
@@ -193,7 +374,12 @@ class Camera(GObject.Object):
         if not device:
             device = udev.get_device_by_id(setup.id)
         if device:
-            return self.set_device(device, setup.resolution, setup.controls)
+            return self.set_device(
+                device,
+                setup.resolution,
+                setup.controls,
+                setup.preview_resolution,
+            )
 
         self.reset()
         self.emit("ready")
@@ -229,9 +415,18 @@ class Camera(GObject.Object):
         device = udev.get_device_by_name(name)
         return self.set_device(device, resolution, controls)
 
-    def set_device(self, device, resolution=None, controls=None):
+    def set_device(self, device, resolution=None, controls=None, preview_resolution=None):
+        if not self._is_recovering_setup:
+            # another device or setup was chosen meanwhile
+            self.cancel_recovery()
+
+        def set_preview_resolution():
+            self.preview_resolution = None
+            if preview_resolution in self.resolutions:
+                self.preview_resolution = Resolution(value=preview_resolution)
 
         def set_resolution():
+            set_preview_resolution()
             if not resolution:
                 return False
 
@@ -246,16 +441,20 @@ class Camera(GObject.Object):
             if not controls:
                 return False
 
+            values = {}
             for name in controls:
                 if name not in self.controls:
                     continue
-                if controls[name] == self.controls[name].value:
+                control = self.controls[name]
+                if controls[name] == control.value:
                     continue
-                sh(
-                    "v4l2-ctl",
-                    "--device", self.device.name,
-                    "--set-ctrl", "{0}={1}".format(name, controls[name]),
-                )
+                values[control.id] = controls[name]
+
+            applied = self._v4l2.set_controls(values)
+            for name in controls:
+                control = self.controls.get(name, None)
+                if control and control.id in applied:
+                    control.value = int(controls[name])
             return True
 
         def abort_init(error):
@@ -263,42 +462,27 @@ class Camera(GObject.Object):
             self._set_status(SETUP_ERROR, error)
             return False
 
-        def init_resolutions():
-            for line in sh(
-                "v4l2-ctl",
-                "--device", self.device.name,
-                "--list-formats-ext",
-            ):
-                if "]: '" in line:
-                    pixelformat = regex(r"'([^']+)'", line)
-                elif "Size:" in line:
-                    width, height = regex(r"(\d+)x(\d+)", line, [1, 2])
+        def init_resolutions(node, resolutions):
+            for pixelformat, code in node.formats():
+                for width, height in node.framesizes(code):
                     resolution = Resolution(
                         width=width,
                         height=height,
                         pixelformat=pixelformat,
                     )
-                    self.resolutions[resolution.value] = resolution
-            n = len(self.resolutions)
+                    resolutions[resolution.value] = resolution
+            n = len(resolutions)
             return n > 0
 
         def init_resolution():
             if set_resolution():
                 return True
 
-            width = 0
-            height = 0
-            pixelformat = ""
-            for line in sh(
-                    "v4l2-ctl",
-                    "--device", self.device.name,
-                    "--get-fmt-video",
-            ):
-                if "Width/Height" in line:
-                    width, height = regex(r"(\d+)/(\d+)", line, [1, 2])
-                elif "Pixel Format" in line:
-                    pixelformat = regex(r"'([^']+)'", line)
+            current = self._v4l2.format()
+            if not current:
+                return False
 
+            width, height, pixelformat = current
             if not width or not height or not pixelformat:
                 return False
 
@@ -309,75 +493,138 @@ class Camera(GObject.Object):
             )
             return True
 
-        def init_controls():
-            in_menu = False
-            for line in sh(
-                "v4l2-ctl",
-                "--device", self.device.name,
-                "--list-ctrls-menus",
-            ):
-                line = line.strip()
-                if " 0x" in line:
-                    in_menu = False
-                    name = line.split("0x", 1)[0].strip()
-                    value = int(regex(r"value=(-?\d+)", line))
-                    inactive = "flags=inactive" in line
-                    if " (int)" in line:
-                        control = Control(
-                            type=CONTROL_INT,
-                            name=name,
-                            value=value,
-                            min=regex(r"min=(-?\d+)", line),
-                            max=regex(r"max=(-?\d+)", line),
-                            step=regex(r"step=(-?\d+)", line),
-                            default=regex(r"default=(-?\d+)", line),
-                            inactive=inactive,
-                            camera=self,
-                        )
-
-                    elif " (bool)" in line:
-                        control = Control(
-                            type=CONTROL_BOOL,
-                            name=name,
-                            value=value,
-                            inactive=inactive,
-                            camera=self,
-                        )
-
-                    elif " (menu)" in line:
-                        in_menu = True
-                        control = Control(
-                            type=CONTROL_MENU,
-                            name=name,
-                            value=value,
-                            inactive=inactive,
-                            camera=self,
-                        )
-
-                    else:
-                        continue
+        def init_controls(node, controls):
+            for query in node.controls():
+                name = v4l2.name_to_var(query.name)
+                value = node.get_control(query.id)
+                if value is None:
+                    continue
+                inactive = bool(query.flags & v4l2.CTRL_FLAG_INACTIVE)
+                if query.type == v4l2.CTRL_TYPE_INTEGER:
+                    control = Control(
+                        type=CONTROL_INT,
+                        id=query.id,
+                        name=name,
+                        value=value,
+                        min=query.minimum,
+                        max=query.maximum,
+                        step=query.step,
+                        default=query.default_value,
+                        inactive=inactive,
+                        camera=self,
+                    )
 
-                    self.controls[name] = control
+                elif query.type == v4l2.CTRL_TYPE_BOOLEAN:
+                    control = Control(
+                        type=CONTROL_BOOL,
+                        id=query.id,
+                        name=name,
+                        value=value,
+                        default=query.default_value,
+                        inactive=inactive,
+                        camera=self,
+                    )
 
-                elif in_menu and line:
-                    menu_value, menu_text = line.split(": ", 1)
-                    control.add_value(menu_text, menu_value)
-            set_controls()
+                elif query.type in (v4l2.CTRL_TYPE_MENU, v4l2.CTRL_TYPE_INTEGER_MENU):
+                    control = Control(
+                        type=CONTROL_MENU,
+                        id=query.id,
+                        name=name,
+                        value=value,
+                        default=query.default_value,
+                        inactive=inactive,
+                        camera=self,
+                    )
+                    for menu_text, menu_value in node.menu(query):
+                        control.add_value(menu_text, str(menu_value))
+
+                else:
+                    continue
+
+                controls[name] = control
             return True
 
-        def setup():
-            self._set_status(SETUP)
-            if not init_resolutions():
-                return abort_init(E_NO_RESOLUTIONS)
-            if not init_resolution():
-                return abort_init(E_NO_RESOLUTION)
-            init_controls()
+        def dump_capabilities():
+            # values are left out; a replugged device is back at its defaults
+            controls = []
+            for name in self.controls:
+                data = self.controls[name].save()
+                del data["value"]
+                controls.append(data)
+            return {
+                "resolutions": list(self.resolutions),
+                "controls": controls,
+            }
+
+        def load_capabilities(node, cached):
+            try:
+                for value in cached["resolutions"]:
+                    self.resolutions[value] = Resolution(value=value)
+                for data in cached["controls"]:
+                    # the current value, so that `set_controls` diffs against
+                    # what the device actually has
+                    value = node.get_control(data["id"])
+                    if value is None:
+                        continue
+                    control = new_control_from_data(dict(data, value=value), self)
+                    self.controls[control.name] = control
+            except (KeyError, TypeError, ValueError):
+                # a broken entry; enumerate the device instead
+                self.resolutions = {}
+                self.controls = {}
+                return False
+            return len(self.resolutions) > 0
+
+        def refresh_capabilities(device, node):
+            # runs after a cached setup; the device is the final word. `node`
+            # fails every request once the camera is reset and closes it
+            resolutions = {}
+            controls = {}
+            if not init_resolutions(node, resolutions) or not init_controls(node, controls):
+                return
+            if self.device is not device or self._v4l2 is not node:
+                # the camera was reset or set to another device in the meantime
+                return
+            cached = dump_capabilities()
+            self.resolutions = resolutions
+            self.controls = controls
+            fresh = dump_capabilities()
+            capabilities.put(device.id, fresh)
+            if fresh != cached:
+                self.emit("ready")
+
+        def finish_setup():
             self._is_threading = False
             self._set_status(IDLE)
             self.emit("ready")
             if stopped_feed:
                 self.start()
 
+        def setup():
+            self._set_status(SETUP)
+            node = v4l2.open(self.device.name)
+            if not node:
+                return abort_init(E_DEVICE_BUSY)
+            self._v4l2 = node
+            self._control_writer = Control_Writer(self, node)
+
+            device = self.device
+            cached = capabilities.get(device.id)
+            if cached and load_capabilities(node, cached) and init_resolution():
+                set_controls()
+                finish_setup()
+                refresh_capabilities(device, node)
+                return
+
+            if not init_resolutions(node, self.resolutions):
+                return abort_init(E_NO_RESOLUTIONS)
+            if not init_resolution():
+                return abort_init(E_NO_RESOLUTION)
+            init_controls(node, self.controls)
+            set_controls()
+            capabilities.put(device.id, dump_capabilities())
+            finish_setup()
+
         if self._is_threading:
             return False
 
@@ -392,7 +639,10 @@ class Camera(GObject.Object):
             # a new device is to be set; stop feed and reinitialise
             stopped_feed = self.stop()
             self._reset()
-            device.in_use = True
+            if not udev.claim(device):
+                # the other camera took it, or it was just unplugged
+                self._set_status(SETUP_ERROR, E_DEVICE_BUSY)
+                return False
             self.device = device
             thread = Thread(target=setup)
             self._is_threading = True
@@ -422,17 +672,49 @@ class Camera(GObject.Object):
             # resolution is not supported; abort
             return False
 
-        # we need to stop any feed to apply a new resolution
-        stop_feed = self._buffer_thread is not False
-        if stopped_feed:
-            _restart_id = self.connect("")
-            self.stop()
+        # we need to stop any feed to apply a new resolution; it starts
+        # again once the device is released
+        self._restart()
         self.resolution = Resolution(value=value)
         self.emit("resolution")
-        if stopped_feed:
-            # TODO: this needs to happen asyncronously
-            # we stopped a feed, let's restart it
-            self.start()
+        return True
+
+    def set_preview_resolution(self, value):
+        """ Streams `value` for the preview and switches to `resolution` only
+        for stills. An empty value previews at the still resolution. """
+
+        if self.status < IDLE:
+            return False
+
+        current = self.preview_resolution.value if self.preview_resolution else ""
+        if current == value:
+            return None
+
+        if value and value not in self.resolutions:
+            return False
+
+        self._restart()
+        self.preview_resolution = Resolution(value=value) if value else None
+        self.emit("resolution")
+        return True
+
+    def get_stream_resolution(self):
+        """ Returns the resolution the feed is streamed at. """
+
+        if self.preview_resolution:
+            return self.preview_resolution
+        return self.resolution
+
+    def capture_still(self):
+        """ Requests a full resolution frame; it is delivered by `still`. """
+
+        if self.status != FEED:
+            return False
+
+        if self._still_requested.is_set():
+            # a still is already on its way
+            return False
+        self._still_requested.set()
         return True
 
     def set_control(self, name, value):
@@ -440,17 +722,10 @@ class Camera(GObject.Object):
             return False
         if name not in self.controls:
             return False
-        if value == self.controls[name].value:
-            return None
 
-        def set():
-            sh(
-                "v4l2-ctl",
-                "--device", self.device.name,
-                "--set-ctrl", "{0}={1}".format(name, value),
-            )
-        Thread(target=set).start()
-        return True
+        # applied by the control writer, which also drops a value the control
+        # has already; `controls` reports when it is done
+        return self._control_writer.write(self.controls[name], value)
 
     def get_device_name(self):
         if self.status < IDLE:
@@ -462,7 +737,7 @@ class Camera(GObject.Object):
             return fallback
         return self.device.model
 
-    def update_sensitivity(self, dialog_widget):
+    def update_sensitivity(self, dialog_widget=None):
         # TODO: this is UI stuff! move to camera_dialog.py
         if self._is_threading:
             return False
@@ -470,126 +745,552 @@ class Camera(GObject.Object):
         if self.status < IDLE:
             return False
 
-        def parse():
-            for line in sh(
-                "v4l2-ctl",
-                "--device", self.device.name,
-                "--list-ctrls-menus",
-            ):
-                if "0x" in line:
-                    is_sensitive = "flags=inactive" not in line
-                    name = line.split("0x", 1)[0].strip()
-                    self.controls[name].set_sensitive(is_sensitive)
-            self._is_threading = False
-
-        self._is_threading = True
-        Thread(target=parse).start()
+        for name in self.controls:
+            control = self.controls[name]
+            query = self._v4l2.query_control(control.id)
+            if query:
+                control.inactive = bool(query.flags & v4l2.CTRL_FLAG_INACTIVE)
+                control.set_sensitive(not control.inactive)
         return True
 
-    def start(self):
-        if self._global_thread:
-            if self._buffer_thread == self._global_thread:
-                return True
-            self._set_status(INIT_ERROR, E_BANDWIDTH)
+    def is_ready(self):
+        # a feed that could not start or broke down may be started again
+        if self.resolution is None:
             return False
+        return self.status in (IDLE, INIT_ERROR, FEED_ERROR)
 
-        if self.status != IDLE:
+    def start(self, standby=False):
+        if self._is_feeding:
+            self.set_standby(standby)
+            return True
+
+        if not self.is_ready():
             self._set_status(INIT_ERROR, E_NOT_READY)
             return False
 
         if self._is_threading:
             return False
 
-        self._feed_interrupt = Event()
-        self._buffer_thread = Thread(target=self._buffer_frame)
-        self._feed_thread = Thread(target=self._feed_frame)
-        self._global_thread = self._buffer_thread
-        self._buffer_thread.start()
-        self._feed_thread.start()
+        if not bandwidth.reserve(self, self.get_stream_resolution(), self.fps):
+            self.suggestion = bandwidth.suggest(self, self.fps)
+            self._set_status(INIT_ERROR, E_BANDWIDTH)
+            return False
+        self.suggestion = None
+
+        with self._feed_lock:
+            # the new buffer thread, not the main loop, waits for the old one
+            feed = Feed(previous=self._buffer_thread)
+            self._feed = feed
+            self.ring = feed.ring
+            self._reset_counters()
+            self.is_standby = standby
+            self._is_feeding = True
+            self._buffer_thread = Thread(target=self._buffer_frame, args=(feed,))
+            self._buffer_thread.start()
+            GLib.timeout_add(int(STALL_CHECK_INTERVAL * 1000), self._watch_feed, feed)
+            if self.has_preview:
+                self._feed_thread = Thread(target=self._feed_frame, args=(feed,))
+                self._feed_thread.start()
+        return True
+
+    def set_standby(self, is_standby):
+        """ Keeps a running feed streaming while another camera previews.
+        Leaving standby only needs the next frame, not a reopened device. """
+
+        if is_standby and not self.is_standby:
+            # never show a stale frame when the feed becomes active
+            self.ring.discard()
+        self.is_standby = is_standby
+        if self._recovery:
+            # restart a recovered feed the way it is wanted now
+            self._recovery["standby"] = is_standby
+        self.ring.notify()
+
+    def set_detector(self, detector):
+        self.detector = detector
 
     # thread target
-    def _buffer_frame(self):
-        self._set_status(INIT)
+    def _buffer_frame(self, feed):
+        previous = feed.previous
+        feed.previous = None
+        if previous and previous.is_alive():
+            # a stopped feed releases the device once its last read returns
+            previous.join(RELEASE_TIMEOUT)
+        if feed.is_interrupted():
+            self._end_feed(feed, None, IDLE)
+            return
+
+        self._set_feed_status(feed, INIT)
+        capture, error = self._open_capture()
+        if error != E_OK:
+            self._end_feed(feed, capture, INIT_ERROR, error)
+            return
+
+        resolution = self.get_stream_resolution()
+        shape = (resolution.height, resolution.width, 3)
+
+        if not self._set_feed_status(feed, FEED):
+            self._end_feed(feed, capture, IDLE)
+            return
+        self.emit("start")
+        feed.frame_tick = time.monotonic()
+        while True:
+            if feed.reopen_requested.is_set():
+                # the watchdog gave up on the stalled capture
+                feed.reopen_requested.clear()
+                capture.release()
+                capture, error = self._open_capture()
+                if error != E_OK:
+                    self._end_feed(feed, capture, FEED_ERROR, E_CAMERA_IO)
+                    return
+
+            if self.is_standby:
+                # dequeue the buffer but skip decoding it
+                if not self._retry(feed, capture.grab):
+                    if feed.is_interrupted():
+                        break
+                    if feed.reopen_requested.is_set():
+                        continue
+                    self._end_feed(feed, capture, FEED_ERROR, E_CAMERA_IO)
+                    return
+                self._frame_arrived(feed)
+                if feed.is_interrupted():
+                    break
+                continue
+
+            frame = self._retry(feed, lambda: self._read_frame(feed.ring, capture, shape))
+            if frame is None:
+                if feed.is_interrupted():
+                    # stopped while reading
+                    break
+                if feed.reopen_requested.is_set():
+                    continue
+                self._end_feed(feed, capture, FEED_ERROR, E_CAMERA_IO)
+                return
+            shape = frame.shape
+            self._frame_arrived(feed)
+
+            detector = self.detector
+            if detector and detector.update(frame):
+                self.emit("settled", frame)
+
+            if self._still_requested.is_set():
+                if self.preview_resolution:
+                    self._capture_still(feed, capture)
+                else:
+                    self._select_still(feed.ring)
+
+            if feed.is_interrupted():
+                break
+
+        self._end_feed(feed, capture, IDLE)
+
+    def _set_feed_status(self, feed, status, error_code=None):
+        """ Sets the status for a feed unless another one was started since;
+        returns whether it is still the current feed. """
+
+        with self._feed_lock:
+            if feed is not self._feed:
+                return False
+            self._set_status(status, error_code)
+        return True
+
+    def _end_feed(self, feed, capture, status, error_code=None):
+        # runs on the buffer thread; a feed that was replaced in the
+        # meantime must not stop or unbook its successor
+        if capture is not None and capture.isOpened():
+            capture.release()
+        with self._feed_lock:
+            is_current = feed is self._feed
+            if is_current and not feed.is_interrupted():
+                self._stop_feed()
+            else:
+                feed.ring.clear()
+            if not is_current:
+                return
+            self._set_status(status, error_code)
+        if feed.restart is not None:
+            GLib.idle_add(self._start_again, feed.restart)
+        elif status == FEED_ERROR:
+            GLib.idle_add(self._begin_recovery)
+        elif status == INIT_ERROR:
+            GLib.idle_add(self._schedule_recovery)
+
+    def _retry(self, feed, read):
+        """ Calls `read` until it returns a frame or `read_retries` more
+        attempts failed. """
+
+        for attempt in range(self.read_retries + 1):
+            result = read()
+            if result is not None and result is not False:
+                return result
+            if attempt == self.read_retries or feed.is_interrupted() or feed.reopen_requested.is_set():
+                break
+            time.sleep(READ_RETRY_DELAY)
+        return None
+
+    def _open_capture(self):
+        """ Opens and configures the device for the stream resolution;
+        returns the capture and an error code. """
+
+        import cv2 as opencv2
+
         capture = opencv2.VideoCapture()
         if not capture.open(
             filename=self.device.name,
             apiPreference=opencv2.CAP_V4L2,
         ):
-            self._stop_buffer(capture)
-            self._set_status(INIT_ERROR, E_DEVICE_BUSY)
-            return
+            return capture, E_DEVICE_BUSY
+
+        error = self._configure_capture(capture, self.get_stream_resolution())
+        if error != E_OK:
+            return capture, error
+
+        # the rate the bandwidth was booked for; drivers may round it
+        capture.set(opencv2.CAP_PROP_FPS, self.fps)
+        # OpenCV 4.6 and later can give up on a read instead of blocking;
+        # the watchdog reopens the capture then
+        timeout = getattr(opencv2, "CAP_PROP_READ_TIMEOUT_MSEC", None)
+        if timeout is not None:
+            capture.set(timeout, int(self.stall_timeout * 1000))
+        return capture, E_OK
+
+    def _frame_arrived(self, feed):
+        tick = time.monotonic()
+        if not feed.has_frame:
+            feed.has_frame = True
+            GLib.idle_add(self._finish_recovery, feed)
+        began = feed.stall
+        if began is not None:
+            feed.stall = None
+            duration = tick - feed.frame_tick
+            self.stalls.append((began, duration))
+            logger.info("Camera %s feeds again after a stall of %.1f s", self.slot, duration)
+        feed.frame_tick = tick
+
+    # main loop
+    def _watch_feed(self, feed):
+        if feed is not self._feed or feed.is_interrupted():
+            # the feed this watchdog was started for ended
+            return False
+        tick = feed.frame_tick
+        if tick is None or feed.stall is not None:
+            return True
+        elapsed = time.monotonic() - tick
+        if elapsed < self.stall_timeout:
+            return True
 
-        if not capture.set(opencv2.CAP_PROP_FRAME_WIDTH, self.resolution.width):
-            self._set_status(INIT_ERROR, E_SET_RESOLUTION)
-            return
+        feed.stall = time.time() - elapsed
+        logger.warning("Camera %s sent no frame for %.1f s; reopening it", self.slot, elapsed)
+        feed.reopen_requested.set()
+        self.emit("stalled", elapsed)
+        return True
+
+    # main loop
+    def _begin_recovery(self):
+        if self._recovery is not None:
+            # a reopened feed failed before its first frame; attempts count
+            # on until one arrives
+            return self._schedule_recovery()
+        if not self.can_recover or not self.device:
+            return False
+        logger.warning("Camera %s (%s) stopped feeding", self.slot, self.device.name)
+        self._recovery = {
+            "tick": time.monotonic(),
+            "time": time.time(),
+            # reapplied as is once the device is back
+            "setup": self.get_setup(),
+            "standby": self.is_standby,
+            "attempts": 0,
+            "source": None,
+            "udev": None,
+            "status": None,
+        }
+        self._schedule_recovery()
+        return False
+
+    # main loop
+    def _schedule_recovery(self):
+        recovery = self._recovery
+        if recovery is None or recovery["source"]:
+            return False
+        if recovery["attempts"] >= RECOVER_ATTEMPTS:
+            logger.warning("Camera %s gave up after %d attempts", self.slot, recovery["attempts"])
+            self.cancel_recovery()
+            return False
+        recovery["source"] = GLib.timeout_add(int(RECOVER_DELAY * 1000), self._recover)
+        return False
+
+    # main loop
+    def _recover(self):
+        recovery = self._recovery
+        if recovery is None:
+            return False
+        recovery["source"] = None
+        if self.device and not self.device.is_removed:
+            # still plugged in; open it again
+            recovery["attempts"] += 1
+            if not self.start(standby=recovery["standby"]):
+                self._schedule_recovery()
+            return False
+
+        # unplugged; wait for a device with the same id
+        self._set_status(RECOVER)
+        device = udev.get_device_by_id(recovery["setup"].id)
+        if device:
+            self._reapply_setup(device)
+        elif recovery["udev"] is None:
+            recovery["udev"] = udev.connect("change", self._device_changed)
+        return False
 
-        if not capture.set(opencv2.CAP_PROP_FRAME_HEIGHT, self.resolution.height):
-            self._set_status(INIT_ERROR, E_SET_RESOLUTION)
+    # handler: udev::change
+    def _device_changed(self, _udev, action, device):
+        recovery = self._recovery
+        if recovery is None or action != udev.ADD or device.id != recovery["setup"].id:
             return
+        udev.disconnect(recovery["udev"])
+        recovery["udev"] = None
+        self._reapply_setup(device)
+
+    def _reapply_setup(self, device):
+        recovery = self._recovery
+        logger.info("Camera %s is back as %s", self.slot, device.name)
+        recovery["attempts"] += 1
+        recovery["status"] = self.connect("status", self._recovery_status)
+        self._is_recovering_setup = True
+        try:
+            # resolution and controls as before the outage
+            is_set = self.set_setup(recovery["setup"])
+        finally:
+            self._is_recovering_setup = False
+        if not is_set and recovery is self._recovery:
+            self.disconnect(recovery["status"])
+            recovery["status"] = None
+            self._schedule_recovery()
+
+    # handler: camera::status
+    def _recovery_status(self, _camera, status):
+        # emitted from the setup thread
+        if status == IDLE:
+            GLib.idle_add(self._restart_recovered)
+        elif status == SETUP_ERROR:
+            GLib.idle_add(self._restart_recovered, False)
+
+    # main loop
+    def _restart_recovered(self, is_set=True):
+        recovery = self._recovery
+        if recovery is None or recovery["status"] is None:
+            return False
+        self.disconnect(recovery["status"])
+        recovery["status"] = None
+        if not is_set or not self.start(standby=recovery["standby"]):
+            self._schedule_recovery()
+        return False
+
+    # main loop
+    def _finish_recovery(self, feed):
+        recovery = self._recovery
+        if recovery is None or feed is not self._feed or feed.is_interrupted():
+            return False
+        duration = time.monotonic() - recovery["tick"]
+        self.outages.append((recovery["time"], duration))
+        logger.info("Camera %s feeds again after %.1f s", self.slot, duration)
+        self._recovery = None
+        self.emit("recovered", duration)
+        return False
 
-        if not capture.set(opencv2.CAP_PROP_FOURCC, self.resolution.fourcode):
-            self._set_status(INIT_ERROR, E_SET_PIXELFORMAT)
+    def is_recovering(self):
+        return self._recovery is not None
+
+    def cancel_recovery(self):
+        """ Stops waiting for a broken feed to come back. """
+
+        recovery = self._recovery
+        if recovery is None:
             return
+        self._recovery = None
+        if recovery["source"]:
+            GLib.source_remove(recovery["source"])
+        if recovery["udev"]:
+            udev.disconnect(recovery["udev"])
+        if recovery["status"]:
+            self.disconnect(recovery["status"])
 
-        self._set_status(FEED)
-        self.emit("start")
-        while True:
-            buffered, frame = capture.read()
-            if not buffered:
-                self._stop_buffer(capture)
-                self._set_status(FEED_ERROR, E_CAMERA_IO)
-                return
+    @staticmethod
+    def _read_frame(ring, capture, shape):
+        """ Decodes the next frame straight into a ring slot and publishes it.
+        Returns the slot's image or `None` if the device stopped. """
 
-            self._frame = frame
+        import numpy
 
-            if self._feed_interrupt is False or self._feed_interrupt.is_set():
-                break
+        index, buffer = ring.acquire(shape)
+        buffered, frame = capture.read(buffer)
+        timestamp = time.monotonic()
+        if not buffered or frame is None:
+            ring.commit(-1)
+            return None
+        if not numpy.shares_memory(frame, buffer):
+            # the driver delivered another size; size the ring for it
+            index, buffer = ring.acquire(frame.shape)
+            numpy.copyto(buffer, frame)
+            frame = buffer
+        ring.commit(index, timestamp)
+        return frame
 
-        self._stop_buffer(capture)
-        self._set_status(IDLE)
+    @staticmethod
+    def _configure_capture(capture, resolution):
+        import cv2 as opencv2
+
+        if not capture.set(opencv2.CAP_PROP_FRAME_WIDTH, resolution.width):
+            return E_SET_RESOLUTION
+
+        if not capture.set(opencv2.CAP_PROP_FRAME_HEIGHT, resolution.height):
+            return E_SET_RESOLUTION
+
+        if not capture.set(opencv2.CAP_PROP_FOURCC, resolution.fourcode):
+            return E_SET_PIXELFORMAT
+
+        return E_OK
+
+    def _read_still(self, feed, capture):
+        shape = (self.resolution.height, self.resolution.width)
+        for i in range(STILL_ATTEMPTS):
+            buffered, frame = capture.read()
+            if not buffered:
+                return None
+            self._frame_arrived(feed)
+            # drop frames that were queued before the switch
+            if frame.shape[0:2] == shape:
+                return frame
+        return None
+
+    def _capture_still(self, feed, capture):
+        tick = time.monotonic()
+        frames = []
+        if self._configure_capture(capture, self.resolution) == E_OK:
+            frame = self._read_still(feed, capture)
+            while frame is not None:
+                frames.append(frame)
+                if len(frames) == STILL_BURST:
+                    break
+                buffered, frame = capture.read()
+                if not buffered:
+                    break
+                self._frame_arrived(feed)
+        self._configure_capture(capture, self.preview_resolution)
+        self.still_latency = time.monotonic() - tick
+        frame, self.still_sharpness = focus.sharpest(frames)
+        self._emit_still(frame)
+
+    def _select_still(self, ring):
+        # preview and stills share one stream; pick from the recent frames
+        with ring.latest(BURST_SIZE) as recent:
+            frame, self.still_sharpness = focus.sharpest([f.image for f in recent])
+            if frame is not None:
+                # the ring reuses the slot once it is released
+                frame = frame.copy()
+        self.still_latency = 0
+        self._emit_still(frame)
+
+    def _emit_still(self, frame):
+        self._still_requested.clear()
+        self.emit("still", frame, self.still_latency)
+
+    def is_still_blurry(self):
+        if self.still_sharpness is None:
+            return False
+        return self.still_sharpness < focus.SHARPNESS_THRESHOLD
 
     # thread target
-    def _feed_frame(self):
+    def _feed_frame(self, feed):
+        ring = feed.ring
+        shown = 0
         while True:
-            if self._frame is not None:
-                frame = opencv2.cvtColor(self._frame, opencv2.COLOR_BGR2RGB)
-                height, width = frame.shape[0:2]
-                pixbuf = GdkPixbuf.Pixbuf.new_from_data(
-                    data=frame.tobytes(),
-                    colorspace=GdkPixbuf.Colorspace.RGB,
-                    has_alpha=False,
-                    bits_per_sample=8,
-                    height=height,
-                    width=width,
-                    rowstride=frame.shape[2] * width,
-                )
-                self.emit("feed", pixbuf, width, height)
-                del pixbuf
-                del frame
-
-            if self._feed_interrupt is False or self._feed_interrupt.wait(1/self.fps):
+            interval = 1 / self.fps
+            has_new_frame = ring.wait(shown, interval, feed.is_interrupted)
+
+            if feed.is_interrupted():
                 break
 
-    def _stop_buffer(self, capture):
-        if capture.isOpened():
-            capture.release()
-        self._stop_feed()
+            latest = ring.latest() if has_new_frame else None
+            if not latest:
+                if not self.is_standby:
+                    self.frames_duplicated += 1
+                continue
+
+            with latest:
+                frame = latest[0]
+                if shown and frame.seq > shown:
+                    self.frames_skipped += frame.seq - shown - 1
+                shown = frame.seq
+
+                tick = time.monotonic()
+                height, width = frame.image.shape[0:2]
+                pixbuf = self._render_preview(frame.image, self.preview_scale)
+            self.emit("feed", pixbuf, width, height)
+            self.frames_shown += 1
+            del pixbuf
+
+            # never preview faster than `Camera.fps`
+            delay = interval - (time.monotonic() - tick)
+            if delay > 0 and feed.interrupt.wait(delay):
+                break
 
-    def _stop_feed(self):
-        self._frame = None
-        self._feed_thread = False
-        self._global_thread = False
-        if self._feed_interrupt:
-            self._feed_interrupt.set()
+    def _render_preview(self, frame, scale):
+        import cv2 as opencv2
+
+        height, width = frame.shape[0:2]
+        preview_width = max(1, round(width * scale))
+        preview_height = max(1, round(height * scale))
+        if preview_width != width or preview_height != height:
+            # shrink before converting; a preview never needs all pixels
+            interpolation = opencv2.INTER_AREA if scale < 1 else opencv2.INTER_LINEAR
+            frame = opencv2.resize(
+                frame,
+                (preview_width, preview_height),
+                interpolation=interpolation,
+            )
+        rgb = opencv2.cvtColor(frame, opencv2.COLOR_BGR2RGB)
+        return framebuffer.new_pixbuf(rgb)
 
-    def stop(self):
-        # make sure there is a thread
-        if not self._global_thread:
+    def set_preview_scale(self, scale):
+        if scale <= 0:
             return False
+        self.preview_scale = scale
+        return True
 
-        # make sure it's our thread
-        if self._global_thread is not self._buffer_thread:
-            return False
+    def _stop_feed(self):
+        # the current feed only; callers hold `_feed_lock`
+        feed = self._feed
+        self._still_requested.clear()
+        self._is_feeding = False
+        bandwidth.release(self)
+        if feed:
+            feed.interrupt.set()
+            feed.ring.clear()
+            feed.ring.notify()
+
+    def _restart(self):
+        """ Stops the feed; a new one starts once its buffer thread released
+        the device. """
+
+        with self._feed_lock:
+            if not self._is_feeding:
+                return False
+            self._feed.restart = self.is_standby
+            self._stop_feed()
+        return True
+
+    # main loop
+    def _start_again(self, standby):
+        self.start(standby=standby)
+        return False
+
+    def stop(self):
+        with self._feed_lock:
+            # make sure there is a feed
+            if not self._is_feeding:
+                return False
 
-        self._stop_feed()
+            self._stop_feed()
         return True
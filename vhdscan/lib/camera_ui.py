@@ -1,4 +1,4 @@
-from gi.repository import Gtk
+from gi.repository import GLib, Gtk
 from . import setup, camera, locale, udev, ui
 from .locale import _
 
@@ -13,6 +13,9 @@ class Camera_UI(ui.Dialog):
         self.controls = []
         self._is_init = False
         self._ready_camera_id = None
+        self._controls_camera_id = None
+        self._udev_ready_id = None
+        self.message_boxes = []
 
         self.control_creator = {
             camera.CONTROL_INT: self.create_control_int,
@@ -41,12 +44,21 @@ class Camera_UI(ui.Dialog):
         self.resolution_box.pack_start([self.resolution_label, self.resolution_select])
         self.resolution_box.add_class("vhd-control")
         self.main_box.pack_start(self.resolution_box)
+
+        self.preview_resolution_label = ui.Label(halign=ui.ALIGN_START)
+        self.preview_resolution_select = ui.Selectbox()
+        self.preview_resolution_select.connect("change", self.preview_resolution_selected)
+        self.preview_resolution_box = ui.Box(orientation=ui.ORIENTATE_VERTICAL, spacing=4)
+        self.preview_resolution_box.pack_start([self.preview_resolution_label, self.preview_resolution_select])
+        self.preview_resolution_box.add_class("vhd-control")
+        self.main_box.pack_start(self.preview_resolution_box)
         self.main_box.show_all()
 
     def update_ui(self, cam):
         self._is_init = True
         self.camera = cam
         self._ready_camera_id = cam.connect("ready", self.update_selectbox_ui)
+        self._controls_camera_id = cam.connect("controls", self.controls_applied)
         self.update_title()
 
         # clear and hide all
@@ -54,12 +66,31 @@ class Camera_UI(ui.Dialog):
         self.device_select.clear()
         self.resolution_box.set_sensitive(False)
         self.resolution_select.clear()
+        self.preview_resolution_box.set_sensitive(False)
+        self.preview_resolution_select.clear()
         self.destroy_controls()
 
-        if len(udev.devices) == 0:
+        self.show_devices()
+        if not udev.is_ready() and self._udev_ready_id is None:
+            # refilled once the cameras are listed
+            self._udev_ready_id = udev.connect("ready", self.devices_listed)
+        self._is_init = False
+
+    def show_devices(self):
+        self.destroy_message_boxes()
+        if not udev.is_ready():
+            self.add_message_box(_("Looking for cameras..."))
+        elif not udev.get_devices():
             self.add_message_box(_("There are no cameras connected."))
         else:
             self.fill_device_select()
+
+    # handler: udev::ready
+    def devices_listed(self, *args):
+        udev.disconnect(self._udev_ready_id)
+        self._udev_ready_id = None
+        self._is_init = True
+        self.show_devices()
         self._is_init = False
 
     def fill_device_select(self):
@@ -67,7 +98,7 @@ class Camera_UI(ui.Dialog):
         current_name = self.camera.get_device_name()
         self.device_box.set_sensitive(True)
         self.device_select.append(_("No Camera"), "")
-        for device in udev.devices:
+        for device in udev.get_devices():
             iter = self.device_select.append(
                 text=self.get_device_name(device),
                 value=device.name,
@@ -101,6 +132,8 @@ class Camera_UI(ui.Dialog):
             self.device_box.set_sensitive(False)
         self.resolution_select.clear()
         self.resolution_box.set_sensitive(False)
+        self.preview_resolution_select.clear()
+        self.preview_resolution_box.set_sensitive(False)
         self.destroy_controls()
 
         if self._is_init:
@@ -126,6 +159,23 @@ class Camera_UI(ui.Dialog):
 
         current_resolution = self.camera.resolution
         self.resolution_select.set_value(current_resolution.value)
+        self.fill_preview_resolution_select()
+
+    def fill_preview_resolution_select(self):
+        self.preview_resolution_box.set_sensitive(True)
+        self.preview_resolution_select.append(_("Same as image resolution"), "")
+        for resolution_value in self.camera.resolutions:
+            resolution = self.camera.resolutions[resolution_value]
+            self.preview_resolution_select.append(
+                text=resolution.name,
+                value=resolution.value,
+            )
+
+        preview_resolution = self.camera.preview_resolution
+        if preview_resolution:
+            self.preview_resolution_select.set_value(preview_resolution.value)
+        else:
+            self.preview_resolution_select.set_active(0)
 
     # handle: resolution_select::change
     def resolution_selected(self, *args):
@@ -135,6 +185,12 @@ class Camera_UI(ui.Dialog):
             self.camera.set_resolution(selected_resolution)
         self.create_controls()
 
+    # handle: preview_resolution_select::change
+    def preview_resolution_selected(self, *args):
+        if not self._is_init:
+            selected_resolution = self.preview_resolution_select.get_value("")
+            self.camera.set_preview_resolution(selected_resolution)
+
     def create_controls(self):
         self.destroy_controls()
         for name in self.camera.controls:
@@ -243,13 +299,19 @@ class Camera_UI(ui.Dialog):
     def control_bool_changed(self, switch, state, name):
         state = 1 if switch.get_active() else 0
         self.camera.set_control(name, state)
-        self.camera.update_sensitivity(self)
 
     # control-hander: selectbox::value-changed
     def control_menu_changed(self, selectbox, name):
         value = selectbox.get_value()
         self.camera.set_control(name, value)
-        self.camera.update_sensitivity(self)
+
+    # handle: camera::controls
+    def controls_applied(self, cam, names):
+        # switching e.g. an auto mode activates or deactivates other controls
+        GLib.idle_add(self._update_sensitivity, cam)
+
+    def _update_sensitivity(self, cam):
+        cam.update_sensitivity(self)
 
     def destroy_controls(self):
         for control in self.controls:
@@ -261,12 +323,18 @@ class Camera_UI(ui.Dialog):
         box.add(ui.Label(label=message))
         box.show_all()
         self.main_box.pack_start(box)
-        self.control_boxes.append(box)
+        self.message_boxes.append(box)
+
+    def destroy_message_boxes(self):
+        for box in self.message_boxes:
+            box.destroy()
+        self.message_boxes = []
 
     def update_translation(self, *args):
         self.update_title()
         self.device_label.set_label(_("Camera Device"))
         self.resolution_label.set_label(_("Image Resolution"))
+        self.preview_resolution_label.set_label(_("Preview Resolution"))
         self.cancel_btn.set_label(_("Cancel"))
         self.ok_btn.set_label(_("Save"))
         for control in self.controls:
@@ -282,6 +350,14 @@ class Camera_UI(ui.Dialog):
             title = _("Setup Camera")
         self.set_title(title)
 
+    def tidy(self):
+        if self._udev_ready_id is not None:
+            udev.disconnect(self._udev_ready_id)
+            self._udev_ready_id = None
+        if self._controls_camera_id is not None:
+            self.camera.disconnect(self._controls_camera_id)
+            self._controls_camera_id = None
+
     def result(self, *args):
         self.camera.disconnect(self._ready_camera_id)
         self._ready_camera_id = None
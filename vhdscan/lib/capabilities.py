@@ -0,0 +1,44 @@
+from os import makedirs as mkdirs
+from os.path import isdir as is_dir, join as join_path
+from threading import Lock
+
+from . import json, settings
+
+
+CACHE_FILE = "devices.cache"
+CACHE_PATH = join_path(settings.CONFIG_DIR, CACHE_FILE)
+
+_data = None
+_lock = Lock()
+
+
+def _load():
+    global _data
+    if _data is None:
+        data = json.read(CACHE_PATH)
+        _data = data if isinstance(data, dict) else {}
+    return _data
+
+
+def get(id):
+    """ Returns the cached capabilities of a `udev.Device.id` or `None`. """
+
+    if not id:
+        return None
+    with _lock:
+        return _load().get(id, None)
+
+
+def put(id, capabilities):
+    """ Stores the capabilities of a `udev.Device.id` on disk. """
+
+    if not id:
+        return
+    with _lock:
+        data = _load()
+        if data.get(id, None) == capabilities:
+            return
+        data[id] = capabilities
+        if not is_dir(settings.CONFIG_DIR):
+            mkdirs(settings.CONFIG_DIR, mode=0o777, exist_ok=True)
+        json.write(CACHE_PATH, data)
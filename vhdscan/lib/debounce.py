@@ -0,0 +1,90 @@
+import time
+
+from threading import Lock, Timer
+
+
+# seconds without a new change before a debounced call runs
+DELAY = 1.0
+# a call runs at least this often while changes keep coming
+MAX_DELAY = 5.0
+
+
+class Debouncer:
+    """ Coalesces calls: the callback runs once on a background thread after
+    calls stopped for `delay` seconds, or `max_delay` after the first one. """
+
+    def __init__(self, callback, delay=DELAY, max_delay=MAX_DELAY):
+        self.callback = callback
+        self.delay = delay
+        self.max_delay = max_delay
+        self._lock = Lock()
+        # never run the callback twice at once, e.g. a timer and a flush
+        self._run_lock = Lock()
+        self._timer = None
+        self._first = None
+        self._generation = 0
+
+    def __call__(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._first is None:
+                self._first = now
+            if self._timer:
+                self._timer.cancel()
+            delay = min(self.delay, max(0, self._first + self.max_delay - now))
+            self._generation += 1
+            self._timer = Timer(delay, self._fire, (self._generation,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def is_pending(self):
+        with self._lock:
+            return self._timer is not None
+
+    def _take(self):
+        is_pending = self._timer is not None
+        if is_pending:
+            self._timer.cancel()
+        self._timer = None
+        self._first = None
+        self._generation += 1
+        return is_pending
+
+    def _fire(self, generation):
+        with self._lock:
+            if generation != self._generation:
+                # rescheduled or flushed meanwhile
+                return
+            self._take()
+        self._run()
+
+    def _run(self):
+        with self._run_lock:
+            return self.callback()
+
+    def flush(self):
+        """ Runs a pending call now, on the calling thread. Returns `False`
+        if there was nothing to run. """
+
+        with self._lock:
+            is_pending = self._take()
+        if is_pending:
+            self._run()
+        else:
+            # wait for a call a timer is running right now
+            with self._run_lock:
+                pass
+        return is_pending
+
+    def call(self):
+        """ Drops a pending call and runs the callback now, on the calling
+        thread, but never along with a call a timer is running. Returns what
+        the callback returns. """
+
+        with self._lock:
+            self._take()
+        return self._run()
+
+    def cancel(self):
+        with self._lock:
+            self._take()
@@ -0,0 +1,81 @@
+import os
+
+from tempfile import mkstemp
+from . import project
+
+
+EXTENSIONS = {
+    project.FORMAT_JPEG: ".jpg",
+    project.FORMAT_PNG: ".png",
+    project.FORMAT_TIFF: ".tiff",
+}
+
+# JPEG chroma subsampling; older OpenCV builds can not set it
+JPEG_SAMPLING_FACTORS = {
+    project.JPEG_SAMPLING_420: "IMWRITE_JPEG_SAMPLING_FACTOR_420",
+    project.JPEG_SAMPLING_422: "IMWRITE_JPEG_SAMPLING_FACTOR_422",
+    project.JPEG_SAMPLING_444: "IMWRITE_JPEG_SAMPLING_FACTOR_444",
+}
+
+# read once; changing the umask to read it is not thread safe
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def get_params(format, options):
+    """ Returns `cv2.imencode` parameters for a format and its options. """
+
+    import cv2 as opencv2
+
+    params = []
+    if format == project.FORMAT_JPEG:
+        params += [opencv2.IMWRITE_JPEG_QUALITY, int(options.get("quality", project.DEFAULT_JPEG_QUALITY))]
+        params += [opencv2.IMWRITE_JPEG_OPTIMIZE, 1]
+        factor = getattr(opencv2, JPEG_SAMPLING_FACTORS.get(options.get("sampling", None), ""), None)
+        if factor is not None:
+            params += [opencv2.IMWRITE_JPEG_SAMPLING_FACTOR, factor]
+
+    elif format == project.FORMAT_PNG:
+        params += [opencv2.IMWRITE_PNG_COMPRESSION, int(options.get("compression", project.DEFAULT_PNG_COMPRESSION))]
+
+    elif format == project.FORMAT_TIFF:
+        params += [opencv2.IMWRITE_TIFF_COMPRESSION, int(options.get("compression", project.DEFAULT_TIFF_COMPRESSION))]
+
+    return params
+
+
+def encode(frame, format, options=None):
+    """ Encodes a BGR `numpy` frame and returns the file contents. """
+
+    import cv2 as opencv2
+
+    if format not in EXTENSIONS:
+        raise ValueError("Unsupported image format: {0}".format(format))
+    is_encoded, data = opencv2.imencode(
+        EXTENSIONS[format],
+        frame,
+        get_params(format, options or {}),
+    )
+    if not is_encoded:
+        raise IOError("Could not encode image as {0}".format(format))
+    return data
+
+
+def write(path, data):
+    """ Writes encoded image data to a file. The file is replaced in one
+    step, so two jobs for the same path never mix their data; the last one
+    to finish wins. """
+
+    directory, filename = os.path.split(os.path.abspath(path))
+    handle, temp_path = mkstemp(dir=directory, prefix="." + filename + ".", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(memoryview(data))
+        os.chmod(temp_path, 0o666 & ~_umask)
+        os.replace(temp_path, path)
+    except:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,34 @@
+# frames are scored at this width; blur shows long before full size
+ANALYSIS_WIDTH = 640
+
+# variance of the Laplacian below which a page counts as blurry
+SHARPNESS_THRESHOLD = 100.0
+
+
+def sharpness(frame):
+    """ Returns the variance of the Laplacian of a BGR frame; the higher,
+    the sharper. """
+
+    import cv2 as opencv2
+
+    height, width = frame.shape[0:2]
+    if width > ANALYSIS_WIDTH:
+        size = (ANALYSIS_WIDTH, max(1, round(height * ANALYSIS_WIDTH / width)))
+        frame = opencv2.resize(frame, size, interpolation=opencv2.INTER_AREA)
+    gray = opencv2.cvtColor(frame, opencv2.COLOR_BGR2GRAY)
+    laplacian = opencv2.Laplacian(gray, opencv2.CV_32F)
+    mean, deviation = opencv2.meanStdDev(laplacian)
+    return float(deviation[0][0]) ** 2
+
+
+def sharpest(frames):
+    """ Returns `(frame, score)` of the sharpest frame or `(None, None)`. """
+
+    best = None
+    best_score = None
+    for frame in frames:
+        score = sharpness(frame)
+        if best_score is None or score > best_score:
+            best = frame
+            best_score = score
+    return best, best_score
@@ -0,0 +1,217 @@
+import bisect
+import time
+
+from gi.repository import GLib, GdkPixbuf
+from threading import Condition
+
+
+# frames a ring holds at most, and the memory they may take
+RING_CAPACITY = 8
+RING_MEMORY = 192 * 1024 * 1024
+# a ring always holds the latest frame, the one being read and one spare
+RING_MIN_CAPACITY = 3
+
+
+def new_pixbuf(frame):
+    """ Copies a contiguous RGB `numpy` frame into a `GdkPixbuf`. """
+
+    height, width, channels = frame.shape
+    # PyGObject only copies a real `bytes` object in one go; any other
+    # buffer is converted element by element
+    data = GLib.Bytes.new(frame.tobytes())
+    return GdkPixbuf.Pixbuf.new_from_bytes(
+        data=data,
+        colorspace=GdkPixbuf.Colorspace.RGB,
+        has_alpha=False,
+        bits_per_sample=8,
+        width=width,
+        height=height,
+        rowstride=frame.strides[0],
+    )
+
+
+class Frame:
+    """ A pinned ring slot; the ring does not overwrite it until it is
+    released. `image` is a view into the ring, not a copy. """
+
+    def __init__(self, ring, index, generation, image, seq, timestamp):
+        self._ring = ring
+        self._index = index
+        self._generation = generation
+        self.image = image
+        self.seq = seq
+        self.timestamp = timestamp
+
+    def release(self):
+        if self._ring:
+            self._ring._unpin(self._index, self._generation)
+            self._ring = None
+
+
+class Frames(list):
+    """ Pinned frames, oldest first; use as a context manager. """
+
+    def release(self):
+        for frame in self:
+            frame.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class Frame_Ring:
+    """ A fixed number of preallocated frames with capture timestamps and
+    sequence numbers. One thread writes; any thread may read. """
+
+    def __init__(self, capacity=RING_CAPACITY, max_bytes=RING_MEMORY):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.condition = Condition()
+        self.seq = 0
+        self.dropped = 0
+        self._shape = None
+        self._images = None
+        self._seqs = []
+        self._times = []
+        self._pins = []
+        # bumped whenever `_pins` is replaced; a frame pinned before does
+        # not release a slot of the new one
+        self._generation = 0
+        self._next = 0
+
+    def _allocate(self, shape):
+        import numpy
+
+        frame_bytes = int(numpy.prod(shape))
+        n = min(self.capacity, self.max_bytes // frame_bytes)
+        n = max(RING_MIN_CAPACITY, n)
+        # frames that are still pinned keep the old array alive
+        self._images = numpy.empty((n,) + tuple(shape), dtype=numpy.uint8)
+        self._shape = tuple(shape)
+        self._seqs = [0] * n
+        self._times = [0.0] * n
+        self._pins = [0] * n
+        self._generation += 1
+        self._next = 0
+
+    def acquire(self, shape):
+        """ Returns `(index, buffer)` to read the next frame into. The index
+        is -1 if every slot is pinned; such a frame is dropped on commit. """
+
+        import numpy
+
+        with self.condition:
+            if self._shape != tuple(shape):
+                self._allocate(shape)
+            n = len(self._pins)
+            for i in range(n):
+                index = (self._next + i) % n
+                # readers waiting for the next frame still get the latest
+                if self._pins[index] == 0 and (self._seqs[index] != self.seq or self.seq == 0):
+                    # hide the slot from readers while it is written
+                    self._seqs[index] = 0
+                    self._next = (index + 1) % n
+                    return index, self._images[index]
+        return -1, numpy.empty(shape, dtype=numpy.uint8)
+
+    def commit(self, index, timestamp=None):
+        """ Publishes the frame read into a slot and wakes waiting readers. """
+
+        with self.condition:
+            if index < 0 or index >= len(self._seqs):
+                # every slot was pinned, or the ring was cleared meanwhile
+                self.dropped += 1
+                return
+            self.seq += 1
+            self._seqs[index] = self.seq
+            self._times[index] = time.monotonic() if timestamp is None else timestamp
+            self.condition.notify_all()
+
+    def _pin(self, indexes):
+        frames = Frames()
+        for index in indexes:
+            self._pins[index] += 1
+            frames.append(Frame(
+                ring=self,
+                index=index,
+                generation=self._generation,
+                image=self._images[index],
+                seq=self._seqs[index],
+                timestamp=self._times[index],
+            ))
+        return frames
+
+    def _unpin(self, index, generation):
+        with self.condition:
+            if generation == self._generation and self._pins[index] > 0:
+                self._pins[index] -= 1
+
+    def _filled(self):
+        indexes = [i for i in range(len(self._seqs)) if self._seqs[i] > 0]
+        indexes.sort(key=lambda i: self._seqs[i])
+        return indexes
+
+    def latest(self, n=1):
+        """ Pins and returns the latest `n` frames, oldest first. """
+
+        with self.condition:
+            return self._pin(self._filled()[-n:])
+
+    def nearest(self, timestamp):
+        """ Pins and returns the frame captured closest to `timestamp`. """
+
+        with self.condition:
+            indexes = self._filled()
+            if not indexes:
+                return Frames()
+            times = [self._times[i] for i in indexes]
+            i = bisect.bisect_left(times, timestamp)
+            candidates = indexes[max(0, i - 1):i + 1]
+            best = min(candidates, key=lambda index: abs(self._times[index] - timestamp))
+            return self._pin([best])
+
+    def _has_newer(self, seq):
+        # a filled slot, not just a higher count; `discard` keeps counting
+        newest = max(self._seqs, default=0)
+        return newest > 0 and newest != seq
+
+    def wait(self, seq, timeout=None, is_interrupted=None):
+        """ Waits for a frame newer than `seq`; returns `True` if there is. """
+
+        def is_ready():
+            if is_interrupted and is_interrupted():
+                return True
+            return self._has_newer(seq)
+
+        with self.condition:
+            is_ready_ = self.condition.wait_for(is_ready, timeout=timeout)
+            return is_ready_ and self._has_newer(seq)
+
+    def discard(self):
+        """ Forgets all frames but keeps counting, e.g. so that a feed never
+        shows a stale frame after standby. """
+
+        with self.condition:
+            self._seqs = [0] * len(self._seqs)
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def clear(self):
+        """ Forgets all frames; pinned frames stay valid until released. """
+
+        with self.condition:
+            self.seq = 0
+            self.dropped = 0
+            self._shape = None
+            self._images = None
+            self._seqs = []
+            self._times = []
+            self._pins = []
+            self._generation += 1
+            self._next = 0
+            self.condition.notify_all()
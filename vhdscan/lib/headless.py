@@ -0,0 +1,399 @@
+import gi
+gi.require_version("GdkPixbuf", "2.0")
+from gi.repository import GLib
+
+import json
+import os
+import socket
+import sys
+import time
+
+from os.path import basename
+from . import camera, postprocess, project, trace, udev, writer
+from .camera import Camera
+from .project import Project
+
+
+HELP = "commands: capture, goto <page>, next, previous, status, quit"
+
+
+class Client:
+    """ A source of commands: stdin or a socket connection. """
+
+    def __init__(self, read, write, close=None):
+        self.read = read
+        self.write = write
+        self.close = close
+        self.buffer = b""
+
+
+class Headless:
+    """ Drives the cameras of a project without any window. Reads one
+    command per line and prints one JSON object per line. """
+
+    def __init__(self, path, socket_path=None):
+        self.path = path
+        self.socket_path = socket_path
+        self.loop = GLib.MainLoop()
+        self.project = None
+        self.camera = None
+        self.camera_1 = None
+        self.camera_2 = None
+        self.writer = writer.Image_Writer()
+        self.writer.connect("job", self.job_changed)
+        self.clients = []
+        self._socket = None
+        self._watches = {}
+        # the capture in flight: requesting client, page and times
+        self._capture = None
+        # timings by job until it is written; not by path, as an overwritten
+        # page may be written twice at once
+        self._timings = {}
+        # quit once the last capture is written
+        self._is_quitting = False
+
+    def run(self):
+        trace.mark("imported")
+        # stdin is a client from the start, so errors are printed
+        self._listen_stdin()
+
+        udev.start()
+        self.project = Project()
+        self.project.connect("error", self.project_error)
+        if not self.project.open(self.path):
+            udev.stop()
+            return 1
+        udev.wait()
+        self.writer.index = self.project.index
+        camera.set_fps(self.project.fps)
+
+        self.camera_1 = self._init_camera(camera.LEFT)
+        self.camera_2 = self._init_camera(camera.RIGHT)
+        self.camera = self.camera_1 if self.is_left_page() else self.camera_2
+        self.camera_1.set_setup(self.project.setup_1)
+        self.camera_2.set_setup(self.project.setup_2)
+
+        if self.socket_path:
+            self._listen_socket()
+
+        self.send(None, "open", path=self.project.path, page=self.project.current_page, total=self.project.total_pages)
+        trace.mark("opened project")
+        trace.report()
+        self.loop.run()
+        self._close()
+        return 0
+
+    def _init_camera(self, slot):
+        cam = Camera(slot)
+        cam.has_preview = False
+        cam.connect("ready", self.camera_ready)
+        cam.connect("status", self.camera_status_changed)
+        cam.connect("still", self.still_captured)
+        cam.connect("recovered", self.camera_recovered)
+        cam.connect("stalled", self.camera_stalled)
+        return cam
+
+    def _close(self):
+        for cam in (self.camera_1, self.camera_2):
+            if cam:
+                cam.cancel_recovery()
+                cam.stop()
+        self.writer.flush()
+        self.writer.index = None
+        postprocess.shutdown()
+        self.project.close()
+        for client in list(self.clients):
+            self._remove_client(client)
+        if self._socket:
+            self._socket.close()
+            os.unlink(self.socket_path)
+        udev.stop()
+
+    def is_left_page(self):
+        return self.project.current_page % 2 == 1
+
+    # output
+    def send(self, client, event, **data):
+        data["event"] = event
+        line = json.dumps(data) + "\n"
+        if client:
+            client.write(line.encode())
+        else:
+            self.broadcast(line)
+
+    def broadcast(self, line):
+        for client in list(self.clients):
+            client.write(line.encode())
+
+    # input
+    def _listen_stdin(self):
+        def write(data):
+            sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+
+        fd = sys.stdin.fileno()
+        self._add_client(Client(lambda: os.read(fd, 4096), write), fd)
+
+    def _listen_socket(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.socket_path)
+        self._socket.listen()
+        GLib.io_add_watch(self._socket.fileno(), GLib.IO_IN, self._accept)
+
+    def _accept(self, *args):
+        connection, address = self._socket.accept()
+
+        def write(data):
+            try:
+                connection.sendall(data)
+            except OSError:
+                pass
+
+        client = Client(lambda: connection.recv(4096), write, connection.close)
+        self._add_client(client, connection.fileno())
+        return True
+
+    def _add_client(self, client, fd):
+        self.clients.append(client)
+        self._watches[client] = GLib.io_add_watch(
+            fd,
+            GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+            self._receive,
+            client,
+        )
+
+    def _remove_client(self, client):
+        watch = self._watches.pop(client, None)
+        if watch:
+            GLib.source_remove(watch)
+        if client in self.clients:
+            self.clients.remove(client)
+        if client.close:
+            client.close()
+
+    def _receive(self, fd, condition, client):
+        try:
+            data = client.read()
+        except OSError:
+            data = b""
+        if not data:
+            self._watches.pop(client, None)
+            if client.close:
+                self.clients.remove(client)
+                client.close()
+            elif not self.socket_path:
+                # stdin closed and nobody else can send commands; stdout
+                # still gets the results of the captures in flight
+                self.quit_when_idle()
+            return False
+
+        client.buffer += data
+        while b"\n" in client.buffer:
+            line, client.buffer = client.buffer.split(b"\n", 1)
+            self.handle(client, line.decode(errors="replace").strip())
+        return True
+
+    def handle(self, client, line):
+        if not line:
+            return
+        command, *args = line.split()
+        if command == "capture":
+            self.capture(client)
+        elif command == "goto" and len(args) == 1 and args[0].isdigit():
+            self.goto(client, int(args[0]))
+        elif command == "next":
+            self.goto(client, self.project.current_page + 1)
+        elif command == "previous":
+            self.goto(client, self.project.current_page - 1)
+        elif command == "status":
+            self.send_status(client)
+        elif command == "quit":
+            self.quit()
+        else:
+            self.send(client, "error", message="unknown command: {0}".format(line), help=HELP)
+
+    def quit(self):
+        self.loop.quit()
+
+    def quit_when_idle(self):
+        self._is_quitting = True
+        if self._capture is None and not self._timings:
+            self.quit()
+
+    # commands
+    def send_status(self, client=None):
+        taken, total = self.project.get_progress()
+        self.send(
+            client,
+            "status",
+            page=self.project.current_page,
+            total=total,
+            taken=taken,
+            slot=self.camera.slot,
+            camera=self.camera.status,
+            stalls=len(self.camera.stalls),
+            queued=self.writer.count(),
+        )
+
+    def capture(self, client):
+        if self._capture:
+            self.send(client, "error", message="busy")
+            return
+        if self.writer.is_full():
+            self.send(client, "error", message="queue full")
+            return
+        self._capture = {
+            "client": client,
+            "camera": self.camera,
+            "page": self.project.current_page,
+            "tick": time.monotonic(),
+        }
+        if not self.camera.capture_still():
+            self._capture = None
+            self.send(client, "error", message="camera not ready", camera=self.camera.status)
+
+    def goto(self, client, page):
+        if page < 1 or page > self.project.total_pages:
+            self.send(client, "error", message="no page {0}".format(page))
+            return
+        self.project.current_page = page
+        self.project.save()
+        self.switch_camera()
+        self.send_status(client)
+
+    def switch_camera(self):
+        previous = self.camera
+        self.camera = self.camera_1 if self.is_left_page() else self.camera_2
+        if previous is self.camera:
+            return
+        previous.set_standby(True)
+        if not self.camera.start():
+            # both feeds do not fit the bus; fall back to a cold switch
+            previous.stop()
+            self.camera.start()
+
+    # handler: camera::ready
+    def camera_ready(self, cam):
+        GLib.idle_add(self._autostart, cam)
+
+    def _autostart(self, cam):
+        # both pages' cameras stream; the other one in standby
+        if cam.is_ready():
+            cam.start(standby=cam is not self.camera)
+
+    # handler: camera::status
+    def camera_status_changed(self, cam, status):
+        GLib.idle_add(self._report_status, cam, status)
+
+    def _report_status(self, cam, status):
+        self.send(None, "camera", slot=cam.slot, status=status, error=cam.error)
+        capture = self._capture
+        if capture and capture["camera"] is cam and cam.status != camera.FEED:
+            # the feed stopped before the still arrived
+            self._capture = None
+            self.send(capture["client"], "error", message="camera stopped", page=capture["page"])
+            self._check_quit()
+
+    # handler: camera::recovered
+    def camera_recovered(self, cam, duration):
+        self.send(None, "recovered", slot=cam.slot, duration=duration, outages=len(cam.outages))
+
+    # handler: camera::stalled
+    def camera_stalled(self, cam, elapsed):
+        self.send(None, "stalled", slot=cam.slot, elapsed=elapsed, stalls=len(cam.stalls) + 1)
+
+    # handler: camera::still
+    def still_captured(self, cam, frame, latency):
+        # emitted from the capture thread
+        GLib.idle_add(self._save_still, cam, frame, latency)
+
+    def _save_still(self, cam, frame, latency):
+        capture = self._capture
+        self._capture = None
+        if capture is not None:
+            self._submit_still(capture, cam, frame, latency)
+        self._check_quit()
+
+    def _submit_still(self, capture, cam, frame, latency):
+        client = capture["client"]
+        page = capture["page"]
+        if frame is None:
+            self.send(client, "error", message="could not take image", page=page)
+            return
+
+        details = self.project.get_image_filename(page)
+        if self.project.is_taken(details["filename"]) and self.project.duplicate_handle != project.DUPLICATE_OVERWRITE:
+            # nobody to ask; keep both images
+            details = self.project.get_free_image_filename(page)
+
+        job = writer.Job(details["path"], frame, details["format"], self.project.get_image_options(details["format"]))
+        job.page = page
+        job.slot = cam.slot
+        job.setup = cam.save()
+        job.stages = self.project.postprocess
+        if not self.writer.submit(job):
+            self.send(client, "error", message="queue full", page=page)
+            return
+        self.project.take_filename(details["filename"])
+        self._timings[job] = {
+            "client": client,
+            "tick": capture["tick"],
+            "still": time.monotonic() - capture["tick"],
+            "latency": latency,
+            "sharpness": cam.still_sharpness,
+            "blurry": cam.is_still_blurry(),
+        }
+
+        if page == self.project.current_page and page < self.project.total_pages:
+            self.goto(None, page + 1)
+
+    # handler: writer::job
+    def job_changed(self, _writer, job):
+        if job.status not in (writer.JOB_DONE, writer.JOB_FAILED):
+            return
+        timing = self._timings.pop(job, None)
+        if timing is not None:
+            self._report_job(job, timing)
+        self._check_quit()
+
+    def _check_quit(self):
+        if self._is_quitting:
+            self.quit_when_idle()
+
+    def _report_job(self, job, timing):
+        if job.status == writer.JOB_FAILED:
+            self.project.release_filename(basename(job.path))
+            self.send(timing["client"], "error", message="could not save", page=job.page, path=job.path, error=str(job.error))
+            return
+        self.send(
+            timing["client"],
+            "captured",
+            page=job.page,
+            path=job.path,
+            slot=job.slot,
+            size=job.size,
+            blurry=timing["blurry"],
+            sharpness=timing["sharpness"],
+            # seconds from the command to the selected frame
+            still_time=timing["still"],
+            # spent switching to the still resolution
+            switch_time=timing["latency"],
+            encode_time=job.encode_time,
+            write_time=job.write_time,
+            # seconds per post-processing stage, in the order they ran
+            stage_times=job.stage_times,
+            derivatives=job.derivatives,
+            total_time=time.monotonic() - timing["tick"],
+        )
+
+    # handler: project::error
+    def project_error(self, _project, code):
+        self.send(None, "error", message="project error", code=code)
+
+
+def run(path, socket_path=None):
+    """ Runs a project without windows; returns the exit code. """
+
+    return Headless(path, socket_path).run()
@@ -0,0 +1,153 @@
+import json
+import sqlite3
+
+from threading import Lock
+
+
+INDEX_FILE = "pages.index"
+
+# `PRAGMA user_version` once the images in the folder have been imported
+IMPORTED = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    page INTEGER NOT NULL,
+    size INTEGER,
+    checksum TEXT,
+    captured REAL,
+    slot TEXT,
+    setup TEXT
+);
+CREATE INDEX IF NOT EXISTS images_page ON images (page);
+"""
+
+
+class Page_Index:
+    """ Remembers every image a project took, so that progress, missing and
+    duplicate pages never need a directory listing. Backed by SQLite; the
+    image writer thread adds to it while the main loop reads. """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        try:
+            # project folders may be on a network share, where WAL's shared
+            # memory does not work; this also takes back an index that was
+            # switched to WAL before
+            self._db.execute("PRAGMA journal_mode=DELETE")
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+        except sqlite3.Error:
+            self._db.close()
+            raise
+
+    def add(self, page, path, size=None, checksum=None, captured=None, slot=None, setup=None):
+        """ Records an image; an image written to the same path replaces the
+        previous record. `setup` is a `Setup.save()` dictionary. """
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, page, size, checksum, captured, slot, json.dumps(setup) if setup else None),
+            )
+            self._db.commit()
+
+    def is_imported(self):
+        with self._lock:
+            return self._db.execute("PRAGMA user_version").fetchone()[0] >= IMPORTED
+
+    def import_images(self, images):
+        """ Records `(page, path, size, captured)` of images that were there
+        before the index, in one transaction; images the index knows keep
+        their record. Marks the index as imported along with them. """
+
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO images (page, path, size, captured) VALUES (?, ?, ?, ?)",
+                    images,
+                )
+                self._db.execute("PRAGMA user_version = {0}".format(IMPORTED))
+                self._db.commit()
+            except sqlite3.Error:
+                self._db.rollback()
+                raise
+
+    def remove(self, path):
+        with self._lock:
+            self._db.execute("DELETE FROM images WHERE path = ?", (path,))
+            self._db.commit()
+
+    def is_empty(self):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM images LIMIT 1").fetchone() is None
+
+    def get_images(self, page):
+        """ Returns the records of a page as dictionaries, oldest first. """
+
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT path, page, size, checksum, captured, slot, setup FROM images WHERE page = ? ORDER BY captured",
+                (page,),
+            )
+            rows = cursor.fetchall()
+        images = []
+        for path, page, size, checksum, captured, slot, setup in rows:
+            images.append({
+                "path": path,
+                "page": page,
+                "size": size,
+                "checksum": checksum,
+                "captured": captured,
+                "slot": slot,
+                "setup": json.loads(setup) if setup else None,
+            })
+        return images
+
+    def count_pages(self, total):
+        """ Returns the number of pages up to `total` with an image. """
+
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(DISTINCT page) FROM images WHERE page BETWEEN 1 AND ?",
+                (total,),
+            ).fetchone()[0]
+
+    def get_duplicates(self, total):
+        """ Returns the pages up to `total` with more than one image. """
+
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT page FROM images WHERE page BETWEEN 1 AND ? GROUP BY page HAVING COUNT(*) > 1 ORDER BY page",
+                (total,),
+            )
+            return [row[0] for row in cursor]
+
+    def get_next_missing(self, page, total):
+        """ Returns the first page after `page` without an image, starting
+        over at page 1, or `None` if every page up to `total` has one. """
+
+        with self._lock:
+            pages = [row[0] for row in self._db.execute(
+                "SELECT DISTINCT page FROM images WHERE page BETWEEN 1 AND ? ORDER BY page",
+                (total,),
+            )]
+        if len(pages) >= total:
+            return None
+        for start, end in ((page + 1, total), (1, page)):
+            expected = start
+            for taken in pages:
+                if taken < expected:
+                    continue
+                if taken > expected or expected > end:
+                    break
+                expected += 1
+            if expected <= end:
+                return expected
+        return None
+
+    def close(self):
+        with self._lock:
+            self._db.close()
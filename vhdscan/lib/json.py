@@ -1,4 +1,12 @@
 import json
+import os
+
+from tempfile import mkstemp
+
+
+# read once; changing the umask to read it is not thread safe
+_umask = os.umask(0)
+os.umask(_umask)
 
 
 def read(path):
@@ -13,7 +21,40 @@ def read(path):
 
 
 def write(path, data):
-    """ Saves a python object to a file in `JSON` format. """
+    """ Saves a python object to a file in `JSON` format. The file is
+    replaced in one step, so a crash never leaves half of it behind. """
 
-    with open(path, "w") as file:
-        json.dump(data, file, indent=2)
+    directory, filename = os.path.split(os.path.abspath(path))
+    handle, temp_path = mkstemp(dir=directory, prefix="." + filename + ".", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w") as file:
+            json.dump(data, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            # keep the permissions of the file being replaced
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o666 & ~_umask)
+        os.replace(temp_path, path)
+    except:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    _sync_directory(directory)
+
+
+def _sync_directory(directory):
+    # make the rename itself durable; not every file system allows this
+    try:
+        handle = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(handle)
+    except OSError:
+        pass
+    finally:
+        os.close(handle)
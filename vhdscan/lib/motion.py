@@ -0,0 +1,95 @@
+import time
+
+
+# frames are compared at this width; enough to see a hand, cheap to diff
+ANALYSIS_WIDTH = 160
+
+# mean absolute grey level difference between two frames (0-255)
+MOTION_THRESHOLD = 6.0
+STILL_THRESHOLD = 1.5
+
+# consecutive still frames before a page counts as settled
+STILL_FRAMES = 5
+
+# detector states
+WAITING = 0
+MOVING = 1
+
+
+class Stillness_Detector:
+    """ Reports when a scene becomes still after it was moving, e.g. after
+    a hand turned the page. """
+
+    def __init__(self, motion_threshold=MOTION_THRESHOLD, still_threshold=STILL_THRESHOLD, still_frames=STILL_FRAMES):
+        self.motion_threshold = motion_threshold
+        self.still_threshold = still_threshold
+        self.still_frames = still_frames
+        self.score = None
+        self.duration = None
+        self._shape = None
+        self._small = None
+        self._gray = None
+        self._previous = None
+        self._diff = None
+        self.reset()
+
+    def reset(self, require_motion=True):
+        """ Rearms the detector. Without `require_motion` the next still
+        scene settles, e.g. the second page of an already open spread. """
+
+        self.state = WAITING if require_motion else MOVING
+        self._still_count = 0
+        self._has_previous = False
+
+    def _allocate(self, frame):
+        height, width = frame.shape[0:2]
+        small_width = min(ANALYSIS_WIDTH, width)
+        small_height = max(1, round(height * small_width / width))
+        self._size = (small_width, small_height)
+        self._small = None
+        self._gray = None
+        self._previous = None
+        self._diff = None
+        self._shape = frame.shape
+        self._has_previous = False
+
+    def update(self, frame):
+        """ Feeds a BGR frame; returns `True` once the scene settled. """
+
+        import cv2 as opencv2
+
+        tick = time.monotonic()
+        if frame.shape != self._shape:
+            self._allocate(frame)
+
+        self._small = opencv2.resize(frame, self._size, dst=self._small, interpolation=opencv2.INTER_AREA)
+        self._gray = opencv2.cvtColor(self._small, opencv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        is_settled = False
+        if self._has_previous:
+            self._diff = opencv2.absdiff(self._gray, self._previous, dst=self._diff)
+            self.score = opencv2.mean(self._diff)[0]
+            is_settled = self._advance(self.score)
+
+        # swap instead of copying; the old buffer is overwritten next time
+        self._gray, self._previous = self._previous, self._gray
+        self._has_previous = True
+        self.duration = time.monotonic() - tick
+        return is_settled
+
+    def _advance(self, score):
+        if self.state == WAITING:
+            if score > self.motion_threshold:
+                self.state = MOVING
+                self._still_count = 0
+            return False
+
+        if score < self.still_threshold:
+            self._still_count += 1
+            if self._still_count >= self.still_frames:
+                self.state = WAITING
+                self._still_count = 0
+                return True
+        else:
+            self._still_count = 0
+        return False
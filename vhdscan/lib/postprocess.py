@@ -0,0 +1,212 @@
+import hashlib
+import importlib
+import multiprocessing
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os.path import basename, dirname, join as join_path, splitext
+from threading import Lock
+from . import encoder
+
+
+# processes that run stages; the cameras keep the other cores
+POOL_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# derivatives are written next to the image, in this folder
+DERIVATIVE_FOLDER = "derivatives"
+
+ROTATIONS = {
+    90: "ROTATE_90_CLOCKWISE",
+    180: "ROTATE_180",
+    270: "ROTATE_90_COUNTERCLOCKWISE",
+}
+
+_pool = None
+_lock = Lock()
+
+
+def rotate(frame, options, context):
+    """ Rotates clockwise by `angle`, one of 90, 180 or 270 degrees. """
+
+    import cv2 as opencv2
+
+    angle = int(options.get("angle", 0)) % 360
+    if angle == 0:
+        return frame
+    if angle not in ROTATIONS:
+        raise ValueError("Can not rotate by {0} degrees".format(angle))
+    return opencv2.rotate(frame, getattr(opencv2, ROTATIONS[angle]))
+
+
+def crop(frame, options, context):
+    """ Cuts `left`, `top`, `right` and `bottom` pixels off the edges. """
+
+    height, width = frame.shape[0:2]
+    left = int(options.get("left", 0))
+    top = int(options.get("top", 0))
+    right = width - int(options.get("right", 0))
+    bottom = height - int(options.get("bottom", 0))
+    if left < 0 or top < 0 or right <= left or bottom <= top:
+        raise ValueError("Can not crop {0}x{1} pixels by {2}".format(width, height, options))
+    return frame[top:bottom, left:right]
+
+
+def color(frame, options, context):
+    """ Applies `contrast`, `brightness` and `gamma` through one lookup
+    table, and optional per channel `gains` in BGR order. """
+
+    import cv2 as opencv2
+    import numpy
+
+    contrast = float(options.get("contrast", 1.0))
+    brightness = float(options.get("brightness", 0.0))
+    gamma = float(options.get("gamma", 1.0))
+    gains = options.get("gains", None) or (1.0, 1.0, 1.0)
+    if len(gains) != 3:
+        raise ValueError("Color gains need three values: {0}".format(gains))
+
+    values = numpy.arange(256, dtype=numpy.float32) / 255
+    tables = []
+    for gain in gains:
+        table = numpy.power(values * float(gain), 1 / gamma) * 255
+        table = table * contrast + brightness
+        tables.append(numpy.clip(table, 0, 255).astype(numpy.uint8))
+    return opencv2.LUT(frame, numpy.dstack(tables))
+
+
+def derivative(frame, options, context):
+    """ Writes a copy of the frame after its own `stages`, scaled down to
+    `max-size` pixels on the longer side, e.g. a thumbnail or an access
+    copy; the frame itself passes on unchanged. """
+
+    import cv2 as opencv2
+
+    image = run(frame, options.get("stages", []), context)
+    max_size = int(options.get("max-size", 0))
+    height, width = image.shape[0:2]
+    if max_size and max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = opencv2.resize(image, size, interpolation=opencv2.INTER_AREA)
+
+    format = options.get("format", context["format"])
+    folder = join_path(dirname(context["path"]), options.get("folder", DERIVATIVE_FOLDER))
+    os.makedirs(folder, exist_ok=True)
+    path = join_path(
+        folder,
+        splitext(basename(context["path"]))[0] + options.get("suffix", "") + encoder.EXTENSIONS[format],
+    )
+    encoder.write(path, encoder.encode(image, format, options.get("options", None)))
+    context["derivatives"].append(path)
+    return frame
+
+
+STAGES = {
+    "rotate": rotate,
+    "crop": crop,
+    "color": color,
+    "derivative": derivative,
+}
+
+
+def get_stage(name):
+    """ Returns the function of a built-in stage, or of a `module:function`
+    plugin that takes and returns a frame like the built-in ones. """
+
+    if name in STAGES:
+        return STAGES[name]
+    module, is_plugin, function = str(name).partition(":")
+    if not is_plugin:
+        raise ValueError("Unknown post-processing stage: {0}".format(name))
+    return getattr(importlib.import_module(module), function)
+
+
+def run(frame, stages, context):
+    """ Runs stages in order; a stage with a `slot` only runs on images of
+    that camera. Appends `(name, seconds)` to `context["times"]`. """
+
+    for options in stages:
+        slot = options.get("slot", None)
+        if slot is not None and slot != context["slot"]:
+            continue
+        stage = get_stage(options.get("stage", None))
+        tick = time.monotonic()
+        frame = stage(frame, options, context)
+        context["times"].append((options.get("name", options["stage"]), time.monotonic() - tick))
+    return frame
+
+
+def process(frame, path, format, options, stages=None, slot=None):
+    """ Runs the stages on a frame, encodes and writes it. Returns what the
+    writer records about the image; runs in a pool process if there are
+    stages to run. """
+
+    context = {
+        "path": path,
+        "format": format,
+        "slot": slot,
+        "times": [],
+        "derivatives": [],
+    }
+    if stages:
+        frame = run(frame, stages, context)
+
+    tick = time.monotonic()
+    data = encoder.encode(frame, format, options)
+    encode_time = time.monotonic() - tick
+    tick = time.monotonic()
+    encoder.write(path, data)
+    write_time = time.monotonic() - tick
+
+    return {
+        "size": len(data),
+        "checksum": hashlib.sha256(memoryview(data)).hexdigest(),
+        "encode_time": encode_time,
+        "write_time": write_time,
+        "stage_times": context["times"],
+        "derivatives": context["derivatives"],
+    }
+
+
+def _init_worker():
+    import cv2 as opencv2
+
+    # one thread per process; the pool is the parallelism
+    opencv2.setNumThreads(1)
+
+
+def submit(*args):
+    """ Runs `process(*args)` on the pool; returns a `Future`. """
+
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = _new_pool()
+        try:
+            return _pool.submit(process, *args)
+        except BrokenProcessPool:
+            # a stage crashed a process; the next image gets a new pool
+            _pool = _new_pool()
+            return _pool.submit(process, *args)
+
+
+def _new_pool():
+    # the application has GTK and camera threads running; do not fork it
+    return ProcessPoolExecutor(
+        max_workers=POOL_WORKERS,
+        mp_context=multiprocessing.get_context("forkserver"),
+        initializer=_init_worker,
+    )
+
+
+def shutdown():
+    """ Waits for submitted images and stops the pool processes. """
+
+    global _pool
+    with _lock:
+        pool = _pool
+        _pool = None
+    if pool:
+        pool.shutdown(wait=True)
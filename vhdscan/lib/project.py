@@ -1,9 +1,12 @@
+import os
+import re
+import sqlite3
 import unicodedata
-from gi.repository import GObject
+from gi.repository import GLib, GObject
 from os import listdir as ls
 from os.path import isdir as is_dir, isfile as is_file, dirname as dirname
 from os.path import basename, join as join_path
-from . import json, setup
+from . import debounce, index, json, setup
 
 FILE_NAME = "project.vhdscan"
 
@@ -30,10 +33,16 @@ TIFF_COMPRESSIONS = [
     ("zlib (lossless)", TIFF_COMPRESSION_ZLIB),
 ]
 
+JPEG_SAMPLING_420 = "420"
+JPEG_SAMPLING_422 = "422"
+JPEG_SAMPLING_444 = "444"
+JPEG_SAMPLINGS = [JPEG_SAMPLING_420, JPEG_SAMPLING_422, JPEG_SAMPLING_444]
+
 FPS = [1, 5, 10, 15, 20, 25, 30]
 
 DEFAULT_FORMAT = FORMAT_JPEG
 DEFAULT_JPEG_QUALITY = 80
+DEFAULT_JPEG_SAMPLING = JPEG_SAMPLING_420
 DEFAULT_PNG_COMPRESSION = 7
 DEFAULT_TIFF_COMPRESSION = TIFF_COMPRESSION_LZW
 DEFAULT_DUPLICATE_HANDLE = DUPLICATE_OVERWRITE
@@ -43,6 +52,7 @@ E_CREATE_FILE_EXISTS = -1
 E_OPEN_EMPTY_PATH = -2
 E_OPEN_NOT_FOUND = -3
 E_OPEN_UNUSABLE = -4
+E_SAVE_FAILED = -5
 
 
 def make_path(path):
@@ -128,6 +138,7 @@ class Project(GObject.Object):
         self.total_pages = None
         self.format = None
         self.jpeg_quality = None
+        self.jpeg_sampling = DEFAULT_JPEG_SAMPLING
         self.png_compression = None
         self.tiff_compression = None
         self.duplicate_handle = None
@@ -136,6 +147,17 @@ class Project(GObject.Object):
         self.setup_2 = None
         self.zoom_level = 100
         self.zoom_mode = None
+        # `postprocess` stages every image runs through before it is saved
+        self.postprocess = []
+        # zoom and page changes come in bursts; write the last state once
+        self._data = None
+        self._saver = debounce.Debouncer(self._write_pending)
+        # a `index.Page_Index` of the images taken so far
+        self.index = None
+        # every filename in the project folder, listed once when opened
+        self._filenames = set()
+        # the last duplicate suffix handed out per image basename
+        self._suffixes = {}
 
     def create(self, path, data):
         path = make_path(path)
@@ -147,7 +169,9 @@ class Project(GObject.Object):
         self.path = path
         self.dirname = dirname(path)
         self.set(data)
-        return self.save()
+        if not self.write():
+            return False
+        return self.open_index()
 
     def open(self, path):
         if not path:
@@ -172,6 +196,7 @@ class Project(GObject.Object):
         self.total_pages = int(data.get("total-pages", 1))
         self.format = data.get("format", DEFAULT_FORMAT)
         self.jpeg_quality = data.get("jpeg-quality", DEFAULT_JPEG_QUALITY)
+        self.jpeg_sampling = str(data.get("jpeg-sampling", DEFAULT_JPEG_SAMPLING))
         self.png_compression = data.get("png-compression", DEFAULT_PNG_COMPRESSION)
         self.tiff_compression = str(data.get("tiff-compression", DEFAULT_TIFF_COMPRESSION))
         self.duplicate_handle = data.get("duplicate-handle", DEFAULT_DUPLICATE_HANDLE)
@@ -182,13 +207,71 @@ class Project(GObject.Object):
 
         self.zoom_level = data.get("zoom-level", None)
         self.zoom_mode = data.get("zoom-mode", None)
-
+        self.postprocess = data.get("postprocess", [])
+
+        return self.open_index()
+
+    def open_index(self):
+        index_path = join_path(self.dirname, index.INDEX_FILE)
+        page_index = None
+        try:
+            page_index = index.Page_Index(index_path)
+            self.index = page_index
+            # also finishes an import that was interrupted
+            self.scan(import_images=not page_index.is_imported())
+        except sqlite3.Error:
+            # e.g. a read-only folder or a broken index file
+            if page_index:
+                page_index.close()
+            self.index = None
+            self.emit("error", E_OPEN_UNUSABLE)
+            return False
         return True
 
+    def scan(self, import_images=False):
+        """ Lists the project folder once; saving images keeps the list up
+        to date. With `import_images` the images found are added to the
+        index, e.g. for a project from before there was an index. """
+
+        self._filenames = set()
+        self._suffixes = {}
+        images = []
+        with os.scandir(self.dirname) as entries:
+            for entry in entries:
+                self._filenames.add(entry.name)
+                if not import_images:
+                    continue
+                page = self.parse_image_filename(entry.name)
+                if page is not None and entry.is_file():
+                    stat = entry.stat()
+                    images.append((page, entry.path, stat.st_size, stat.st_mtime))
+        if import_images:
+            self.index.import_images(images)
+
+    def is_taken(self, filename):
+        return filename in self._filenames
+
+    def take_filename(self, filename):
+        """ Marks a filename as used, e.g. when an image is queued. """
+
+        self._filenames.add(filename)
+
+    def release_filename(self, filename):
+        # an image that could not be written
+        self._filenames.discard(filename)
+
+    def close(self):
+        """ Writes pending changes and releases the index. """
+
+        self.flush()
+        if self.index:
+            self.index.close()
+            self.index = None
+
     def update(self, data):
         self.set(data)
         self.current_page = min(self.current_page, self.total_pages)
-        return self.save()
+        return self.write()
 
     def set(self, data):
         self.name = data["name"].strip()
@@ -201,13 +284,47 @@ class Project(GObject.Object):
         self.duplicate_handle = data["duplicate-handle"]
 
     def save(self):
+        """ Schedules a write of the current state; see `flush()`. """
+
+        if not self.path:
+            return False
+
+        self._data = self.get_data()
+        self._saver()
+        return True
+
+    def flush(self):
+        """ Writes a scheduled save now, e.g. before the project closes. """
+
+        self._saver.flush()
+
+    def write(self):
+        """ Writes the project file right away. """
+
         if not self.path:
             return False
 
-        json.write(self.path, {
+        self._data = self.get_data()
+        # waits for a scheduled write that is running, so that it can not
+        # replace this one with an older state
+        return self._saver.call()
+
+    def _write_pending(self):
+        data = self._data
+        try:
+            json.write(self.path, data)
+        except OSError:
+            # may run on the debouncer's thread
+            GLib.idle_add(self.emit, "error", E_SAVE_FAILED)
+            return False
+        return True
+
+    def get_data(self):
+        return {
             "name": self.name,
             "format": self.format,
             "jpeg-quality": self.jpeg_quality,
+            "jpeg-sampling": self.jpeg_sampling,
             "png-compression": self.png_compression,
             "tiff-compression": int(self.tiff_compression),
             "current-page": self.current_page,
@@ -218,8 +335,8 @@ class Project(GObject.Object):
             "zoom-mode": self.zoom_mode,
             "camera-1": self.setup_1.save(),
             "camera-2": self.setup_2.save(),
-        })
-        return True
+            "postprocess": self.postprocess,
+        }
 
     def get_name(self):
         if not self.path or not self.name:
@@ -227,10 +344,71 @@ class Project(GObject.Object):
         return self.name
 
     def get_current_image_filename(self):
+        return self.get_image_filename(self.current_page)
+
+    def get_progress(self):
+        """ Returns `(taken, total)` pages according to the index. """
+
+        if not self.index:
+            return 0, self.total_pages
+        return self.index.count_pages(self.total_pages), self.total_pages
+
+    def get_next_missing_page(self):
+        if not self.index:
+            return None
+        return self.index.get_next_missing(self.current_page, self.total_pages)
+
+    def parse_image_filename(self, filename):
+        """ Returns the page of an image filename of this project, including
+        suffixed duplicates, or `None`. """
+
+        match = re.match(
+            r"^(\d+)_{0}(?: \(\d+\))?\.{1}$".format(
+                re.escape(sanitize_filename(self.name)),
+                re.escape(self.format),
+            ),
+            filename,
+        )
+        if not match:
+            return None
+        return int(match.group(1))
+
+    def get_image_options(self, format):
+        """ Returns the `encoder` options of an image format. """
+
+        if format == FORMAT_JPEG:
+            return {
+                "quality": self.jpeg_quality,
+                "sampling": self.jpeg_sampling,
+            }
+        if format == FORMAT_TIFF:
+            return {"compression": self.tiff_compression}
+        if format == FORMAT_PNG:
+            return {"compression": self.png_compression}
+        return {}
+
+    def get_free_image_filename(self, page):
+        """ Returns `get_image_filename()` with the next unused duplicate
+        suffix, e.g. `0001_name (2).jpeg`, without touching the disk. """
+
+        details = self.get_image_filename(page)
+        key = (details["basename"], details["format"])
+        i = self._suffixes.get(key, 0)
+        while True:
+            i += 1
+            filename = "%s (%d).%s" % (details["basename"], i, details["format"])
+            if filename not in self._filenames:
+                break
+        self._suffixes[key] = i
+        details["filename"] = filename
+        details["path"] = join_path(details["dirname"], filename)
+        return details
+
+    def get_image_filename(self, page):
         # TODO: custom filename patterns
 
-        n = len(str(self.pages))
-        page = str(self.page).zfill(n)
+        n = len(str(self.total_pages))
+        page = str(page).zfill(n)
 
         # 0 ext | 1 name | 2 page
         pattern = '{1}_{0}'
@@ -1,15 +1,25 @@
+import copy
+import fcntl
+
 from os import makedirs as mkdirs
 from os.path import isdir as is_dir, join as join_path
+from threading import Lock
 from appdirs import user_config_dir
 
-from . import json
+from . import debounce, json
 
 
 CONFIG_FILE = "vhdscan.config"
 CONFIG_DIR = user_config_dir(appname="vhdscan")
 CONFIG_PATH = join_path(CONFIG_DIR, CONFIG_FILE)
+# held while the config is read, merged and replaced
+CONFIG_LOCK_PATH = join_path(CONFIG_DIR, "." + CONFIG_FILE + ".lock")
 CONFIG_RECENTS = 15
 
+# geometry changes arrive many times a second while a window is dragged
+SAVE_DELAY = 0.5
+SAVE_MAX_DELAY = 2.0
+
 STARTUP_DO_NOTHING = "do-nothing"
 STARTUP_OPEN_LAST_PROJECT = "open-last-project"
 
@@ -21,19 +31,98 @@ _data = {
     "window-geometry": {}
 }
 
+_lock = Lock()
+# changed since the last write: a key, or `(key, name)` for one window
+_dirty = set()
+# projects opened since the last write, oldest first
+_opened = []
+
 
 def load():
     data = json.read(CONFIG_PATH)
     if isinstance(data, dict):
-        global _data
-        _data.update(data)
+        with _lock:
+            _data.update(data)
+
+
+def _merge(data, dirty, opened):
+    """ Applies the changes of this instance to a config another instance
+    may have written meanwhile. """
+
+    for change in dirty:
+        if isinstance(change, tuple):
+            key, name = change
+            if not isinstance(data.get(key, None), dict):
+                data[key] = {}
+            data[key][name] = _data[key][name]
+        elif change != "recent":
+            data[change] = _data[change]
+
+    if "recent" in dirty:
+        recent = data.get("recent", None)
+        if not isinstance(recent, list):
+            recent = list(_data["recent"])
+        for path in opened:
+            if path in recent:
+                recent.remove(path)
+            recent.insert(0, path)
+        data["recent"] = recent[0:CONFIG_RECENTS]
+
+    return data
+
+
+def _write():
+    with _lock:
+        dirty = _dirty.copy()
+        opened = list(_opened)
+        _dirty.clear()
+        _opened.clear()
+        defaults = copy.deepcopy(_data)
+    if not dirty:
+        return
+
+    try:
+        if not is_dir(CONFIG_DIR):
+            mkdirs(CONFIG_DIR, mode=0o777, exist_ok=True)
+        with open(CONFIG_LOCK_PATH, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = json.read(CONFIG_PATH)
+            if not isinstance(data, dict):
+                data = defaults
+            with _lock:
+                data = _merge(data, dirty, opened)
+            json.write(CONFIG_PATH, data)
+    except OSError:
+        # keep the changes for the next attempt
+        with _lock:
+            _dirty.update(dirty)
+            _opened[0:0] = opened
+        return
+
+    with _lock:
+        # take over what other instances changed, unless changed again here
+        for key, value in data.items():
+            if key not in _dirty and not any(isinstance(change, tuple) and change[0] == key for change in _dirty):
+                _data[key] = value
+
+
+_saver = debounce.Debouncer(_write, delay=SAVE_DELAY, max_delay=SAVE_MAX_DELAY)
 
 
 def save():
-    if not is_dir(CONFIG_DIR):
-        mkdirs(CONFIG_DIR, mode=0o777, exist_ok=True)
+    """ Schedules writing the changed settings; see `flush()`. """
+
+    _saver()
+
+
+def flush():
+    """ Writes pending changes now, e.g. when the application quits. """
+
+    _saver.flush()
+
 
-    json.write(CONFIG_PATH, _data)
+def _change(key):
+    _dirty.add(key)
 
 
 def get(key, fallback=None):
@@ -41,21 +130,25 @@ def get(key, fallback=None):
 
 
 def update(data):
-    global _data
-    for key in _data:
-        if key in data:
-            _data[key] = data[key]
+    with _lock:
+        for key in _data:
+            if key in data:
+                _data[key] = data[key]
+                _change(key)
     save()
 
 
 def set(key, value):
-    _data[key] = value
+    with _lock:
+        _data[key] = value
+        _change(key)
     save()
 
 
 def set_geometry(name, x, y, width, height, is_maximized, is_fullscreen):
-    global _data
-    _data["window-geometry"][name] = [x, y, width, height, is_maximized, is_fullscreen]
+    with _lock:
+        _data["window-geometry"][name] = [x, y, width, height, is_maximized, is_fullscreen]
+        _change(("window-geometry", name))
     save()
 
 
@@ -70,12 +163,12 @@ def get_recent():
 
 
 def add_recent(project):
-    global _data
-    for path in _data["recent"]:
-        if path == project.path:
-            _data["recent"].remove(project.path)
-            break
-
-    _data["recent"].insert(0, project.path)
-    _data["recent"] = _data["recent"][0:CONFIG_RECENTS]
+    with _lock:
+        recent = [path for path in _data["recent"] if path != project.path]
+        recent.insert(0, project.path)
+        _data["recent"] = recent[0:CONFIG_RECENTS]
+        if project.path in _opened:
+            _opened.remove(project.path)
+        _opened.append(project.path)
+        _change("recent")
     save()
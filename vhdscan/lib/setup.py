@@ -5,6 +5,7 @@ class Setup:
         self.id = ""
         self.udev_name = ""
         self.resolution = ""
+        self.preview_resolution = ""
         self.controls = {}
 
     def save(self):
@@ -12,6 +13,7 @@ class Setup:
             "id": self.id,
             "udev_name": self.udev_name,
             "resolution": self.resolution,
+            "preview_resolution": self.preview_resolution,
             "controls": self.controls,
         }
 
@@ -24,6 +26,8 @@ class Setup:
             return False
         if self.resolution != other.resolution:
             return False
+        if self.preview_resolution != other.preview_resolution:
+            return False
         for name in self.controls:
             if name not in other.controls:
                 return False
@@ -43,6 +47,8 @@ def new_from_camera(camera):
         setup.udev_name = device.name
     if camera.resolution:
         setup.resolution = camera.resolution.value
+    if camera.preview_resolution:
+        setup.preview_resolution = camera.preview_resolution.value
     for name in camera.controls:
         setup.controls[name] = camera.controls[name].value
     return setup
@@ -52,6 +58,7 @@ def new_from_data(data):
     setup = Setup()
     setup.id = data.get("id", "")
     setup.resolution = data.get("resolution", "")
+    setup.preview_resolution = data.get("preview_resolution", "")
     setup.udev_name = data.get("udev_name", "")
     setup.controls = data.get("controls", {})
     return setup
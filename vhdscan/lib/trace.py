@@ -0,0 +1,106 @@
+import builtins
+import sys
+import time
+
+from threading import local
+
+
+# imports faster than this are left out of the import report
+IMPORT_THRESHOLD = 0.001
+IMPORT_LIMIT = 30
+
+# process start, as close as this module gets to it
+_start = time.perf_counter()
+_marks = []
+is_enabled = False
+
+# import statement -> [cumulative, self] seconds
+_imports = {}
+# per thread: time spent in nested imports of the running import
+_nested = local()
+
+
+def enable():
+    global is_enabled
+    is_enabled = True
+
+
+def profile_imports():
+    """ Times every import from now on, including the modules it imports
+    itself. Imports of modules that are loaded already are skipped. """
+
+    enable()
+    original = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        key = _get_import_key(name, globals, fromlist, level)
+        if key in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        stack = getattr(_nested, "stack", None)
+        if stack is None:
+            stack = _nested.stack = []
+        stack.append(0.0)
+        tick = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - tick
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            entry = _imports.setdefault(key, [0.0, 0.0])
+            entry[0] += elapsed
+            entry[1] += elapsed - nested
+
+    builtins.__import__ = timed_import
+
+
+def _get_import_key(name, globals, fromlist, level):
+    if level > 0 and globals:
+        package = globals.get("__package__") or ""
+        if level > 1:
+            package = package.rsplit(".", level - 1)[0]
+        name = package + "." + name if name else package
+    if fromlist and name in sys.modules:
+        # `from . import camera` loads a submodule, not the package
+        missing = [item for item in fromlist if item != "*" and name + "." + item not in sys.modules]
+        if missing:
+            return name + "." + ",".join(missing)
+    return name
+
+
+def mark(name):
+    """ Records how long after start a step finished. """
+
+    if is_enabled:
+        _marks.append((name, time.perf_counter()))
+
+
+def report(file=None):
+    """ Prints every mark with its time since start and since the mark
+    before it. """
+
+    if not is_enabled:
+        return
+    file = file or sys.stderr
+    previous = _start
+    for name, tick in _marks:
+        print(
+            "{0:9.1f} ms {1:+9.1f} ms  {2}".format(
+                (tick - _start) * 1000,
+                (tick - previous) * 1000,
+                name,
+            ),
+            file=file,
+        )
+        previous = tick
+
+    entries = [(key, times) for key, times in _imports.items() if times[0] >= IMPORT_THRESHOLD]
+    if entries:
+        entries.sort(key=lambda entry: entry[1][0], reverse=True)
+        print("", file=file)
+        print("{0:>9} {1:>9}  {2}".format("total ms", "self ms", "import"), file=file)
+        for key, (cumulative, own) in entries[0:IMPORT_LIMIT]:
+            print("{0:9.1f} {1:9.1f}  {2}".format(cumulative * 1000, own * 1000, key), file=file)
+    file.flush()
@@ -1,16 +1,28 @@
-from gi.repository import GObject
-from pyudev import Context, Monitor, MonitorObserver
+import logging
+
+from gi.repository import GLib, GObject
+from threading import Event, RLock, Thread
+from . import trace
 
 
 SUBSYSTEM = "video4linux"
 
+ADD = "add"
+REMOVE = "remove"
+
+logger = logging.getLogger(__name__)
+
 
 class Device:
 
     def __init__(self, udev_device):
         p = udev_device.properties
         self._udev_device = udev_device
+        # claimed by a camera; see `claim()`
         self.in_use = False
+        # unplugged; a camera may still hold on to it
+        self.is_removed = False
+        self.sys_path = udev_device.sys_path
         self.model = p.get("ID_MODEL", "").replace("_", " ")
         self.vendor = p.get("ID_VENDOR", "").replace("_", " ")
         self.vendor_id = p.get("ID_VENDOR_ID", "0000").upper()
@@ -19,14 +31,28 @@ class Device:
         self.name = p.get("DEVNAME")
         self.id = "{0}:{1}:{2}".format(self.vendor_id, self.model_id, self.revision)
 
-    def equals(self, udev_device):
-        return self._udev_device == udev_device
+        # cameras on the same bus share its bandwidth
+        usb_device = udev_device.find_parent("usb", "usb_device")
+        self.bus = _get_attribute(usb_device, "busnum")
+        speed = _get_attribute(usb_device, "speed")
+        self.speed = int(float(speed)) if speed else None
+
+
+def _get_attribute(udev_device, name):
+    if udev_device is None:
+        return None
+    try:
+        return udev_device.attributes.asstring(name)
+    except (KeyError, UnicodeDecodeError):
+        return None
 
 
 class _Signal(GObject.Object):
 
     __gsignals__ = {
-        "change": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        # action, `Device`
+        "change": (GObject.SignalFlags.RUN_FIRST, None, (str, object)),
+        "ready": (GObject.SignalFlags.RUN_FIRST, None, ()),
     }
 
     def __init__(self):
@@ -36,62 +62,133 @@ class _Signal(GObject.Object):
 _signal = _Signal()
 
 
+# guards the indexes and `Device.in_use`; udev events arrive on the
+# observer's thread while cameras look up devices on others
+_lock = RLock()
+# devnode, e.g. `/dev/video0` -> `Device`
+_by_name = {}
+# sysfs path -> `Device`; stable while a device is plugged in
+_by_path = {}
+# `Device.id` -> `Device`s in the order they were found; identical models
+# share an id
+_by_id = {}
+# removed while the initial list was read; never listed afterwards
+_gone = set()
+
+
+def _add(device, replace=True):
+    with _lock:
+        previous = _by_path.get(device.sys_path, None)
+        if previous:
+            if not replace:
+                return False
+            _remove(previous)
+        _by_path[device.sys_path] = device
+        _by_name[device.name] = device
+        _by_id.setdefault(device.id, []).append(device)
+    return True
+
+
+def _remove(device):
+    with _lock:
+        device.is_removed = True
+        _by_path.pop(device.sys_path, None)
+        if _by_name.get(device.name, None) is device:
+            del _by_name[device.name]
+        same_id = _by_id.get(device.id, [])
+        if device in same_id:
+            same_id.remove(device)
+        if not same_id:
+            _by_id.pop(device.id, None)
+
+
+def _emit_change(action, device):
+    # handlers run on the main loop, not on the observer's thread
+    GLib.idle_add(_emit, "change", action, device)
+
+
+def _emit(*args):
+    _signal.emit(*args)
+    return False
+
+
+# handler: observer thread
 def _observe(udev_device):
-    global devices
-
-    if udev_device.action == "add":
+    if udev_device.action == ADD:
         if not _can_capture(udev_device):
             return
 
         device = Device(udev_device)
-        devices.append(device)
-        _signal.emit("change", "add")
-
-    elif udev_device.action == "remove":
-        for device in devices:
-            if not device.equals(udev_device):
-                return
+        _add(device)
+        _emit_change(ADD, device)
 
-            devices.remove(device)
-            _signal.emit("change", "remove")
-            return
+    elif udev_device.action == REMOVE:
+        with _lock:
+            device = _by_path.get(udev_device.sys_path, None)
+            if device:
+                _remove(device)
+            elif not _ready.is_set():
+                _gone.add(udev_device.sys_path)
+        if device:
+            _emit_change(REMOVE, device)
 
 
 def _can_capture(udev_device):
     return "capture" in udev_device.properties.get("ID_V4L_CAPABILITIES", "")
 
 
+def get_devices():
+    """ Returns the plugged in capture devices, sorted by devnode. """
+
+    with _lock:
+        return sorted(_by_path.values(), key=lambda device: device.name or "")
+
+
 def get_device(id, name):
-    if id and name:
-        for device in devices:
-            if device.in_use:
-                continue
+    """ Returns the unclaimed device with both `id` and devnode `name`. """
 
-            if device.id == id and device.name == name:
+    if id and name:
+        with _lock:
+            device = _by_name.get(name, None)
+            if device and not device.in_use and device.id == id:
                 return device
     return None
 
 
 def get_device_by_id(id):
     if id:
-        for device in devices:
-            if device.in_use:
-                continue
-            if device.id == id:
-                return device
+        with _lock:
+            for device in _by_id.get(id, []):
+                if not device.in_use:
+                    return device
     return None
 
 
 def get_device_by_name(name):
     if name:
-        for device in devices:
-            if device.in_use:
-                continue
-            if device.name == name:
+        with _lock:
+            device = _by_name.get(name, None)
+            if device and not device.in_use:
                 return device
     return None
 
 
+def claim(device):
+    """ Marks a device as used by a camera. Returns `False` if another
+    camera has it or it was unplugged meanwhile. """
+
+    with _lock:
+        if device.in_use or device.is_removed:
+            return False
+        device.in_use = True
+        return True
+
+
+def release(device):
+    with _lock:
+        device.in_use = False
+
+
 def connect(signal, callback, *args):
     return _signal.connect(signal, callback, *args)
 
@@ -100,22 +197,80 @@ def disconnect(handler_id):
     _signal.disconnect(handler_id)
 
 
-def stop():
-    _observer.stop()
+_ready = Event()
+_thread = None
+_observer = None
+_is_stopped = False
+
+
+def start():
+    """ Lists the cameras and starts watching for new ones on a background
+    thread; `ready` is emitted on the main loop once the list is complete. """
+
+    global _thread
+    if _thread:
+        return
+    _thread = Thread(target=_start, daemon=True)
+    _thread.start()
+
+
+# thread target
+def _start():
+    try:
+        _list()
+    except Exception:
+        # without udev there are no cameras, but nothing may wait forever
+        logger.exception("Could not list the cameras")
+    finally:
+        with _lock:
+            _gone.clear()
+            _ready.set()
+        GLib.idle_add(_emit_ready)
+
+
+def _list():
+    global _observer
+    # pyudev loads here, off the main thread
+    from pyudev import Context, Monitor, MonitorObserver
 
+    context = Context()
+    if not _is_stopped:
+        # watch first, so nothing plugged in while listing is missed
+        monitor = Monitor.from_netlink(context)
+        monitor.filter_by(subsystem=SUBSYSTEM)
+        _observer = MonitorObserver(
+            monitor=monitor,
+            callback=_observe,
+        )
+        _observer.start()
 
-devices = []
-_context = Context()
-for udev_device in _context.list_devices(subsystem=SUBSYSTEM):
-    if not _can_capture(udev_device):
-        continue
+    for udev_device in context.list_devices(subsystem=SUBSYSTEM):
+        if _can_capture(udev_device):
+            with _lock:
+                if udev_device.sys_path in _gone:
+                    continue
+                # the observer may know a newer state of this device
+                _add(Device(udev_device), replace=False)
 
-    devices.append(Device(udev_device))
 
-_monitor = Monitor.from_netlink(_context)
-_monitor.filter_by(subsystem=SUBSYSTEM)
-_observer = MonitorObserver(
-    monitor=_monitor,
-    callback=_observe,
-)
-_observer.start()
+def _emit_ready():
+    trace.mark("listed cameras")
+    _signal.emit("ready")
+    return False
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def wait(timeout=None):
+    """ Blocks until the cameras are listed; returns `False` on timeout. """
+
+    return _ready.wait(timeout)
+
+
+def stop():
+    global _is_stopped
+    _is_stopped = True
+    if _observer:
+        _observer.stop()
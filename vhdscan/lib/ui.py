@@ -1,5 +1,5 @@
 from gi.repository import Gtk, Gdk, GObject, Pango
-from . import locale
+from . import locale, trace
 from os.path import realpath
 from .locale import _
 
@@ -350,6 +350,35 @@ class Window(UI):
         return None
 
 
+class Lazy_Window:
+    """ Stands in for a window that is only built, Glade file and all, when
+    it is first used. Does nothing on `destroy()` if it was never built. """
+
+    def __init__(self, window_class, *args, **kwargs):
+        self._window_class = window_class
+        self._args = args
+        self._kwargs = kwargs
+        self._window = None
+
+    def get(self):
+        if self._window is None:
+            self._window = self._window_class(*self._args, **self._kwargs)
+            # the locale may have changed before the window existed
+            self._window.update_translation()
+            trace.mark("built " + self._window_class.__name__)
+        return self._window
+
+    def is_built(self):
+        return self._window is not None
+
+    def destroy(self):
+        if self._window is not None:
+            self._window.destroy()
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
 class Dialog(Window):
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,394 @@
+import ctypes
+import errno
+import fcntl
+import os
+
+from threading import Lock
+
+
+# Everything goes through `ioctl` so it can be replaced without a camera,
+# e.g. `v4l2.ioctl = fake_ioctl`.
+ioctl = fcntl.ioctl
+
+BUF_TYPE_VIDEO_CAPTURE = 1
+
+FRMSIZE_TYPE_DISCRETE = 1
+FRMSIZE_TYPE_CONTINUOUS = 2
+FRMSIZE_TYPE_STEPWISE = 3
+
+CTRL_TYPE_INTEGER = 1
+CTRL_TYPE_BOOLEAN = 2
+CTRL_TYPE_MENU = 3
+CTRL_TYPE_INTEGER_MENU = 9
+
+CTRL_FLAG_DISABLED = 0x0001
+CTRL_FLAG_INACTIVE = 0x0010
+CTRL_FLAG_NEXT_CTRL = 0x80000000
+
+
+class fmtdesc(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("description", ctypes.c_char * 32),
+        ("pixelformat", ctypes.c_uint32),
+        ("mbus_code", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+class frmsize_discrete(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+    ]
+
+
+class frmsize_stepwise(ctypes.Structure):
+    _fields_ = [
+        ("min_width", ctypes.c_uint32),
+        ("max_width", ctypes.c_uint32),
+        ("step_width", ctypes.c_uint32),
+        ("min_height", ctypes.c_uint32),
+        ("max_height", ctypes.c_uint32),
+        ("step_height", ctypes.c_uint32),
+    ]
+
+
+class frmsize(ctypes.Union):
+    _fields_ = [
+        ("discrete", frmsize_discrete),
+        ("stepwise", frmsize_stepwise),
+    ]
+
+
+class frmsizeenum(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("pixel_format", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("size", frmsize),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+class pix_format(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+        ("pixelformat", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("bytesperline", ctypes.c_uint32),
+        ("sizeimage", ctypes.c_uint32),
+        ("colorspace", ctypes.c_uint32),
+        ("priv", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("ycbcr_enc", ctypes.c_uint32),
+        ("quantization", ctypes.c_uint32),
+        ("xfer_func", ctypes.c_uint32),
+    ]
+
+
+class format_union(ctypes.Union):
+    _fields_ = [
+        ("pix", pix_format),
+        ("raw_data", ctypes.c_uint8 * 200),
+        # the kernel union holds pointers, which sets its alignment
+        ("_align", ctypes.c_void_p),
+    ]
+
+
+class format(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("fmt", format_union),
+    ]
+
+
+class queryctrl(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("name", ctypes.c_char * 32),
+        ("minimum", ctypes.c_int32),
+        ("maximum", ctypes.c_int32),
+        ("step", ctypes.c_int32),
+        ("default_value", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 2),
+    ]
+
+
+class querymenu_union(ctypes.Union):
+    _pack_ = 1
+    _fields_ = [
+        ("name", ctypes.c_char * 32),
+        ("value", ctypes.c_int64),
+    ]
+
+
+class querymenu(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("index", ctypes.c_uint32),
+        ("menu", querymenu_union),
+        ("reserved", ctypes.c_uint32),
+    ]
+
+
+class control(ctypes.Structure):
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("value", ctypes.c_int32),
+    ]
+
+
+class ext_control_union(ctypes.Union):
+    _pack_ = 1
+    _fields_ = [
+        ("value", ctypes.c_int32),
+        ("value64", ctypes.c_int64),
+        ("ptr", ctypes.c_void_p),
+    ]
+
+
+class ext_control(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [
+        ("id", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32 * 1),
+        ("data", ext_control_union),
+    ]
+
+
+class ext_controls(ctypes.Structure):
+    _fields_ = [
+        ("which", ctypes.c_uint32),
+        ("count", ctypes.c_uint32),
+        ("error_idx", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+        ("reserved", ctypes.c_uint32 * 1),
+        ("controls", ctypes.POINTER(ext_control)),
+    ]
+
+
+def _IOWR(nr, struct):
+    # _IOC(_IOC_READ | _IOC_WRITE, 'V', nr, sizeof(struct))
+    return (3 << 30) | (ctypes.sizeof(struct) << 16) | (ord("V") << 8) | nr
+
+
+VIDIOC_G_FMT = _IOWR(4, format)
+VIDIOC_ENUM_FMT = _IOWR(2, fmtdesc)
+VIDIOC_G_CTRL = _IOWR(27, control)
+VIDIOC_S_CTRL = _IOWR(28, control)
+VIDIOC_QUERYCTRL = _IOWR(36, queryctrl)
+VIDIOC_QUERYMENU = _IOWR(37, querymenu)
+VIDIOC_S_EXT_CTRLS = _IOWR(72, ext_controls)
+VIDIOC_ENUM_FRAMESIZES = _IOWR(74, frmsizeenum)
+
+# `ext_controls.which`; current values of any control class
+CTRL_WHICH_CUR_VAL = 0
+
+
+def fourcc_to_str(code):
+    """ Turns a V4L2 pixelformat code into its four letters, e.g. `YUYV`. """
+
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip()
+
+
+def str_to_fourcc(name):
+    """ Turns four letters, e.g. `YUYV`, into a V4L2 pixelformat code. """
+
+    name = (name + "    ")[0:4]
+    return sum(ord(char) << (8 * i) for i, char in enumerate(name))
+
+
+def name_to_var(name):
+    """ Turns a control name into the key `v4l2-ctl` uses for it, e.g.
+    `White Balance Temperature, Auto` becomes
+    `white_balance_temperature_auto`. """
+
+    if isinstance(name, bytes):
+        name = name.decode("utf-8", "replace")
+    var = ""
+    add_underscore = False
+    for c in name:
+        if c.isalnum():
+            if add_underscore:
+                var += "_"
+            add_underscore = False
+            var += c.lower()
+        elif var:
+            add_underscore = True
+    return var
+
+
+class Device:
+    """ An open V4L2 device node. `fd` takes a descriptor that is open
+    already, e.g. none at all along with a fake `ioctl`. Once closed, every
+    request fails with `EBADF`; closing waits for a request in flight, so
+    the number of a closed descriptor is never reused by mistake. """
+
+    def __init__(self, path, fd=None):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK) if fd is None else fd
+        self._lock = Lock()
+
+    def close(self):
+        with self._lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _ioctl(self, request, struct):
+        with self._lock:
+            if self.fd is None:
+                raise OSError(errno.EBADF, os.strerror(errno.EBADF), self.path)
+            ioctl(self.fd, request, struct, True)
+        return struct
+
+    def formats(self):
+        """ Yields the fourcc of every capture pixelformat. """
+
+        index = 0
+        while True:
+            desc = fmtdesc(index=index, type=BUF_TYPE_VIDEO_CAPTURE)
+            try:
+                self._ioctl(VIDIOC_ENUM_FMT, desc)
+            except OSError:
+                return
+            yield fourcc_to_str(desc.pixelformat), desc.pixelformat
+            index += 1
+
+    def framesizes(self, pixelformat):
+        """ Yields `(width, height)` for a pixelformat code. For stepwise
+        devices only the smallest and largest size are reported. """
+
+        index = 0
+        while True:
+            size = frmsizeenum(index=index, pixel_format=pixelformat)
+            try:
+                self._ioctl(VIDIOC_ENUM_FRAMESIZES, size)
+            except OSError:
+                return
+            if size.type == FRMSIZE_TYPE_DISCRETE:
+                yield size.size.discrete.width, size.size.discrete.height
+            else:
+                stepwise = size.size.stepwise
+                yield stepwise.min_width, stepwise.min_height
+                yield stepwise.max_width, stepwise.max_height
+                return
+            index += 1
+
+    def format(self):
+        """ Returns `(width, height, fourcc)` of the current format. """
+
+        fmt = format(type=BUF_TYPE_VIDEO_CAPTURE)
+        try:
+            self._ioctl(VIDIOC_G_FMT, fmt)
+        except OSError:
+            return None
+        pix = fmt.fmt.pix
+        return pix.width, pix.height, fourcc_to_str(pix.pixelformat)
+
+    def controls(self):
+        """ Yields a `queryctrl` for every user control, disabled ones
+        excluded. """
+
+        id = CTRL_FLAG_NEXT_CTRL
+        while True:
+            query = queryctrl(id=id)
+            try:
+                self._ioctl(VIDIOC_QUERYCTRL, query)
+            except OSError:
+                return
+            id = query.id | CTRL_FLAG_NEXT_CTRL
+            if not query.flags & CTRL_FLAG_DISABLED:
+                yield query
+
+    def query_control(self, id):
+        query = queryctrl(id=id)
+        try:
+            self._ioctl(VIDIOC_QUERYCTRL, query)
+        except OSError:
+            return None
+        return query
+
+    def menu(self, query):
+        """ Yields `(text, index)` for every entry of a menu control. """
+
+        for index in range(query.minimum, query.maximum + 1):
+            item = querymenu(id=query.id, index=index)
+            try:
+                self._ioctl(VIDIOC_QUERYMENU, item)
+            except OSError:
+                # menus may have gaps
+                continue
+            if query.type == CTRL_TYPE_INTEGER_MENU:
+                text = str(item.menu.value)
+            else:
+                text = item.menu.name.decode("utf-8", "replace")
+            yield text, index
+
+    def get_control(self, id):
+        ctrl = control(id=id)
+        try:
+            self._ioctl(VIDIOC_G_CTRL, ctrl)
+        except OSError:
+            return None
+        return ctrl.value
+
+    def set_control(self, id, value):
+        try:
+            self._ioctl(VIDIOC_S_CTRL, control(id=id, value=int(value)))
+        except OSError:
+            return False
+        return True
+
+    def set_controls(self, values):
+        """ Applies a `{id: value}` dict with a single ioctl and returns the
+        ids that were set. Falls back to one ioctl per control if the driver
+        rejects the batch. """
+
+        if not values:
+            return set()
+
+        items = list(values.items())
+        array = (ext_control * len(items))()
+        for i, (id, value) in enumerate(items):
+            array[i].id = id
+            array[i].data.value = int(value)
+        batch = ext_controls(
+            which=CTRL_WHICH_CUR_VAL,
+            count=len(items),
+            controls=array,
+        )
+        try:
+            self._ioctl(VIDIOC_S_EXT_CTRLS, batch)
+            return set(values)
+        except OSError:
+            pass
+
+        applied = set()
+        for id, value in items:
+            if self.set_control(id, value):
+                applied.add(id)
+        return applied
+
+
+def open(path):
+    """ Opens a device node; returns `None` if it can not be opened. """
+
+    try:
+        return Device(path)
+    except OSError:
+        return None
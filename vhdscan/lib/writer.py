@@ -0,0 +1,186 @@
+import queue
+import sqlite3
+import time
+
+from functools import partial
+from gi.repository import GLib, GObject
+from threading import Lock, Thread
+from . import postprocess
+
+
+# images not yet written before `Take Image` is held back
+QUEUE_SIZE = 4
+
+# job status
+JOB_FAILED = -1
+JOB_QUEUED = 0
+JOB_WRITING = 1
+JOB_DONE = 2
+
+
+class Job:
+
+    def __init__(self, path, frame, format, options=None):
+        self.path = path
+        self.frame = frame
+        self.format = format
+        self.options = options or {}
+        self.status = JOB_QUEUED
+        self.error = None
+        self.duration = None
+        self.encode_time = None
+        self.write_time = None
+        self.size = None
+        self.checksum = None
+        # wall clock time the image was taken
+        self.captured = time.time()
+        # recorded in the page index if set
+        self.page = None
+        self.slot = None
+        self.setup = None
+        # shown along with the job status, e.g. a blurry page
+        self.warning = None
+        # `postprocess` stages run on the frame before it is encoded
+        self.stages = None
+        # `(name, seconds)` of every stage that ran
+        self.stage_times = None
+        # paths of the derivatives written by the stages
+        self.derivatives = None
+
+    def get_arguments(self):
+        """ Returns the arguments of `postprocess.process()`. """
+
+        return (self.frame, self.path, self.format, self.options, self.stages, self.slot)
+
+    def run(self):
+        self.apply(postprocess.process(*self.get_arguments()))
+
+    def apply(self, result):
+        self.size = result["size"]
+        self.checksum = result["checksum"]
+        self.encode_time = result["encode_time"]
+        self.write_time = result["write_time"]
+        self.stage_times = result["stage_times"]
+        self.derivatives = result["derivatives"]
+
+
+class Image_Writer(GObject.Object):
+    """ Encodes and writes images on a background thread, or on the
+    `postprocess` pool if a job has stages to run. """
+
+    __gsignals__ = {
+        "job": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+    }
+
+    def __init__(self, size=QUEUE_SIZE):
+        GObject.Object.__init__(self)
+        self._size = size
+        self._queue = queue.Queue()
+        # by job, not by path; an overwritten page may be queued twice
+        self._pending = set()
+        self._lock = Lock()
+        # a `index.Page_Index` that learns about every written page
+        self.index = None
+        self._thread = Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        """ Queues a job; returns `False` if the queue is full. """
+
+        with self._lock:
+            # jobs on the pool leave the queue before they are written
+            if len(self._pending) >= self._size:
+                return False
+            self._pending.add(job)
+            self._queue.put_nowait(job)
+        self._emit(job)
+        return True
+
+    def is_full(self):
+        with self._lock:
+            return len(self._pending) >= self._size
+
+    def count(self):
+        """ Returns the number of jobs that are not written yet. """
+
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """ Blocks until every queued image is written, also those on the
+        pool. """
+
+        self._queue.join()
+
+    def _emit(self, job):
+        # handlers run on the main loop, not on the writer thread
+        GLib.idle_add(self._emit_job, job)
+
+    def _emit_job(self, job):
+        self.emit("job", job)
+        return False
+
+    def _record(self, job):
+        index = self.index
+        if index is None or job.page is None:
+            return
+        try:
+            index.add(
+                page=job.page,
+                path=job.path,
+                size=job.size,
+                checksum=job.checksum,
+                captured=job.captured,
+                slot=job.slot,
+                setup=job.setup,
+            )
+        except sqlite3.Error as error:
+            # the image is safe; only the index missed it
+            job.error = error
+
+    # thread target
+    def _write(self):
+        while True:
+            job = self._queue.get()
+            job.status = JOB_WRITING
+            self._emit(job)
+            tick = time.monotonic()
+            if job.stages:
+                # stages are CPU bound; run them next to the following pages
+                try:
+                    future = postprocess.submit(*job.get_arguments())
+                except Exception as error:
+                    self._finish(job, tick, error)
+                    continue
+                future.add_done_callback(partial(self._processed, job, tick))
+                continue
+
+            try:
+                job.run()
+            except Exception as error:
+                self._finish(job, tick, error)
+                continue
+            self._finish(job, tick)
+
+    # runs on a thread of the pool
+    def _processed(self, job, tick, future):
+        try:
+            job.apply(future.result())
+        except Exception as error:
+            self._finish(job, tick, error)
+            return
+        self._finish(job, tick)
+
+    def _finish(self, job, tick, error=None):
+        if error is None:
+            job.status = JOB_DONE
+            self._record(job)
+        else:
+            job.status = JOB_FAILED
+            job.error = error
+        job.duration = time.monotonic() - tick
+        job.frame = None
+        with self._lock:
+            self._pending.discard(job)
+        self._queue.task_done()
+        self._emit(job)